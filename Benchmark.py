@@ -0,0 +1,342 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from Cache import SatCache
+from Stats import Stats
+from Heuristics import HEURISTICS
+from ModelFinder import ModelFinder
+import Reasoner
+import Parser
+import Simplify
+import Test
+import Workloads
+
+"""
+Benchmarks for the reasoner, reproducible enough to compare two revisions.
+
+    Benchmark.py run [--engine ...] [--heuristic ...] [--simplify] [--model-search WORLDS] [--cases ...]
+                     [--output results.json]
+    Benchmark.py compare old.json new.json [--threshold 0.1]
+
+Every case (a label and an engine setting) runs in a process of its own, so it can be killed when it exceeds its
+timeout. In there it is decided a few times as warmup, then timed with perf_counter for a number of trials, and finally
+run once more under tracemalloc for its peak memory (tracemalloc slows everything down, so that run is not timed), and
+once with a Stats for the number of nodes: branching rules applied, plus the decisions of the dpll engine.
+Reported are the median and the interquartile range of the trials. Once a case of a family times out, the larger ones
+of that family are skipped for that engine and heuristic. --simplify and --model-search are part of the case as well,
+as in Reasoner.py: a case is only compared with the same case of another run. Labels from files with known answers
+(see Workloads.py) are checked, a wrong verdict gets the status "wrong".
+
+The results are saved as JSON, together with the git revision and the machine, and compare flags every case that got
+slower by more than the threshold, beyond the noise of both runs. It also flags changed verdicts and new timeouts.
+Its exit code is 1 if there is anything to flag, so it can be used in scripts.
+"""
+
+# family -> (description, generator of the formula of size n)
+FAMILIES = {
+    "phi": ("ϕ_n, which has no polynomial model", Test.exp_model_formula),
+    "size": ("a (trivial) formula of size 2^(n+1)", Test.exp_size_formula),
+    "chain": ("2^n negations in front of an atom", lambda n: Test.formula_of_size_2(2 ** n)),
+}
+
+
+def revision() -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return rev + "+dirty" if dirty else rev
+
+
+# the label of a case. Built in the process that runs the case, formulae do not have to be sent around
+def __label(family: str, arg: int | str) -> set:
+    if family == "file":
+        return Parser.parse_label_str(arg)
+    return {FAMILIES[family][1](arg)}
+
+
+# runs in its own process. Sends ("time", seconds) per trial, then ("memory", peak bytes), ("nodes", int) and
+# ("verdict", bool)
+def __run_case(conn, family: str, arg: int | str, engine: str, cache_size: int, jobs: int, threshold: int,
+               warmup: int, repeat: int, heuristic: str, simplify: bool, model_worlds: int | None):
+    if hasattr(os, "setpgrp"):  # a group of its own, with the pool workers. A timeout then kills all of them at once
+        os.setpgrp()
+    label = __label(family, arg)
+    pool = None
+    if jobs > 1:
+        import Parallel
+        pool = Parallel.make_pool(jobs, engine, cache_size, True, heuristic, model_worlds=model_worlds)
+
+    def decide(stats: Stats | None = None) -> bool:
+        if pool is not None:  # the worker caches live as long as the pool, i.e. over all trials
+            normal = Reasoner.normalized(label)
+            return Parallel.parallel_successful(Simplify.simplified(normal) if simplify else normal, pool, jobs,
+                                                threshold, stats)
+        # a fresh finder per trial, with the same seed, so every trial searches the same way
+        finder = ModelFinder(model_worlds) if model_worlds is not None else None
+        return Reasoner.decide(label, engine, SatCache(cache_size) if cache_size > 0 else None, stats, simplify,
+                               heuristic, finder=finder)
+
+    try:
+        satisfiable = None
+        for trial in range(warmup + repeat):
+            start = time.perf_counter()
+            satisfiable = decide()
+            seconds = time.perf_counter() - start
+            if trial >= warmup:
+                conn.send(("time", seconds))
+        tracemalloc.start()
+        decide()
+        conn.send(("memory", tracemalloc.get_traced_memory()[1]))
+        tracemalloc.stop()
+        stats = Stats()
+        decide(stats)
+        conn.send(("nodes", stats.rules["NotAnd"] + stats.rules["NotBox"] + stats.decisions))
+        if pool is not None:  # before the verdict, afterwards this process may be gone any moment
+            pool.shutdown()
+        conn.send(("verdict", satisfiable))
+    except Exception as e:
+        conn.send(("error", repr(e)))
+    finally:
+        conn.close()
+
+
+def run_case(family: str, arg: int | str, engine: str, cache_size: int = 0, jobs: int = 1, threshold: int = 200,
+             warmup: int = 1, repeat: int = 5, timeout: float = 30, heuristic: str = "size", simplify: bool = False,
+             model_worlds: int | None = None) -> dict:
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=__run_case, args=(sender, family, arg, engine, cache_size, jobs,
+                                                               threshold, warmup, repeat, heuristic, simplify,
+                                                               model_worlds))
+    process.start()
+    sender.close()
+    result = {"family": family, "n": arg, "engine": engine, "heuristic": heuristic, "simplify": simplify,
+              "model_search": model_worlds, "cache_size": cache_size, "jobs": jobs, "status": "timeout",
+              "verdict": None, "times": [], "peak_memory": None, "nodes": None}
+    deadline = time.monotonic() + timeout
+    while result["status"] == "timeout":
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not receiver.poll(remaining):
+            break
+        try:
+            kind, value = receiver.recv()
+        except EOFError:  # the process died without telling us why
+            result["status"] = "error"
+            result["error"] = f"exit code {process.exitcode}"
+            break
+        match kind:
+            case "time":
+                result["times"].append(value)
+            case "memory":
+                result["peak_memory"] = value
+            case "nodes":
+                result["nodes"] = value
+            case "verdict":
+                result["verdict"] = "sat" if value else "unsat"
+                result["status"] = "ok"
+            case "error":
+                result["status"] = "error"
+                result["error"] = value
+    if process.is_alive():
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.terminate()
+    process.join()
+    receiver.close()
+
+    times = result["times"]
+    result["median"] = statistics.median(times) if times else None
+    if len(times) >= 2:
+        quartiles = statistics.quantiles(times, n=4, method="inclusive")
+        result["iqr"] = quartiles[2] - quartiles[0]
+    else:
+        result["iqr"] = 0.0 if times else None
+    return result
+
+
+def case_name(result: dict) -> str:
+    if result["family"] == "file":
+        return f"file:{result['file']}:{result['line']}"
+    return f"{result['family']}_{result['n']}"
+
+
+# what identifies a case across runs. Results from before there were heuristics used "size", and neither simplified
+# nor searched for models
+def case_key(result: dict) -> tuple:
+    return (case_name(result), result["engine"], result.get("heuristic", "size"), result.get("simplify", False),
+            result.get("model_search"), result["cache_size"], result["jobs"])
+
+
+# the engine, and the heuristic, simplify and model search unless they are the default
+def __setting(result: dict) -> str:
+    setting = result["engine"]
+    if result.get("heuristic", "size") != "size":
+        setting += f"/{result['heuristic']}"
+    if result.get("simplify", False):
+        setting += "+simplify"
+    if result.get("model_search") is not None:
+        setting += f"+model{result['model_search']}"
+    return setting
+
+
+def __ms(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.3f} ms"
+
+
+def __describe(result: dict) -> str:
+    line = f"{case_name(result):<24} {__setting(result):<26} "
+    if result["status"] == "error":
+        return line + f"error: {result.get('error')}"
+    line += f"median {__ms(result['median']):>14}  IQR {__ms(result['iqr']):>12}"
+    if result["peak_memory"] is not None:
+        line += f"  peak {result['peak_memory'] / 2 ** 10:.1f} KB"
+    if result.get("nodes") is not None:
+        line += f"  {result['nodes']} nodes"
+    match result["status"]:
+        case "ok":
+            return line + f"  {result['verdict']}"
+        case "wrong":
+            return line + f"  {result['verdict']} WRONG, expected {result['expected']}"
+        case _:
+            return line + "  timeout"
+
+
+def run(args) -> dict:
+    cases: list[tuple[str, int | str, dict]] = []  # family, argument, extra fields for the result
+    for family in args.cases:
+        for n in range(args.max_n + 1):
+            cases.append((family, n, {}))
+    for path in args.file:
+        answers = Workloads.expected(path)
+        with open(path, encoding="utf-8") as f:
+            labels = [(line_no, line) for line_no, line in enumerate(f, start=1) if line.strip()]
+        for i, (line_no, line) in enumerate(labels):
+            extra = {"file": path, "line": line_no}
+            if answers is not None:
+                extra["expected"] = answers[i]
+            cases.append(("file", line, extra))
+
+    results = []
+    for engine in args.engine:
+        for heuristic in args.heuristic:
+            timed_out: set[str] = set()  # families that timed out with this engine and heuristic
+            for family, arg, extra in cases:
+                if family in timed_out:
+                    continue
+                result = run_case(family, arg, engine, args.cache_size, args.jobs, args.split_threshold,
+                                  args.warmup, args.repeat, args.timeout, heuristic, args.simplify, args.model_search)
+                if family == "file":
+                    result["n"] = None  # the label itself is in the file
+                result.update(extra)
+                if result["status"] == "ok" and result.get("expected", result["verdict"]) != result["verdict"]:
+                    result["status"] = "wrong"
+                results.append(result)
+                print(__describe(result), flush=True)
+                if result["status"] == "timeout" and family != "file":
+                    timed_out.add(family)
+
+    report = {
+        "revision": revision(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"warmup": args.warmup, "repeat": args.repeat, "timeout": args.timeout},
+        "results": results,
+    }
+    output = args.output or f"benchmark-{report['revision'][:12]}.json"
+    with open(output, encoding="utf-8", mode="w") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    print(f"Saved to {output}")
+    return report
+
+
+# returns the number of flagged cases
+def compare(old: dict, new: dict, threshold: float = 0.1) -> int:
+    print(f"old: {old['revision']} ({old['date']})")
+    print(f"new: {new['revision']} ({new['date']})")
+    old_results = {case_key(result): result for result in old["results"]}
+    flagged = 0
+    for result in new["results"]:
+        before = old_results.get(case_key(result))
+        if before is None:
+            continue
+        note = ""
+        if before["status"] == "ok" and result["status"] == "ok" and before["verdict"] != result["verdict"]:
+            note = f"VERDICT CHANGED ({before['verdict']} -> {result['verdict']})"
+        elif before["status"] == "ok" and result["status"] != "ok":
+            note = f"REGRESSION ({result['status']})"
+        elif before["status"] != "ok" and result["status"] == "ok":
+            note = f"fixed ({before['status']} before)"
+        elif before["median"] is not None and result["median"] is not None:
+            change = result["median"] / before["median"] - 1 if before["median"] > 0 else 0.0
+            # a difference within the spread of the trials is noise, however large it is relatively
+            noise = max(before["iqr"] or 0.0, result["iqr"] or 0.0)
+            significant = abs(result["median"] - before["median"]) > noise
+            note = f"{change:+.1%}"
+            if change > threshold and significant:
+                note += " REGRESSION"
+            elif change < -threshold and significant:
+                note += " faster"
+        if "REGRESSION" in note or "VERDICT" in note:
+            flagged += 1
+        print(f"{case_name(result):<24} {__setting(result):<26} {__ms(before['median']):>14} -> "
+              f"{__ms(result['median']):>14}  {note}")
+    print(f"{flagged} case(s) flagged")
+    return flagged
+
+
+def main(argv: list[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Benchmarks for the reasoner")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save the results as JSON")
+    run_parser.add_argument("--engine", nargs="+", choices=Reasoner.ENGINES, default=["recursive"],
+                            help="tableau implementations to benchmark, see Reasoner.py")
+    run_parser.add_argument("--heuristic", nargs="+", choices=HEURISTICS, default=["size"],
+                            help="branching heuristics to benchmark, each with every engine. See Heuristics.py")
+    run_parser.add_argument("--simplify", action="store_true", help="simplify every label first, see Simplify.py")
+    run_parser.add_argument("--model-search", type=int, metavar="WORLDS",
+                            help="look for a model of up to this many worlds before the tableau, see ModelFinder.py")
+    run_parser.add_argument("--cache-size", type=int, default=0, help="SatCache size, a fresh cache per trial")
+    run_parser.add_argument("--jobs", type=int, default=1, help="worker processes, see Parallel.py")
+    run_parser.add_argument("--split-threshold", type=int, default=200, help="with --jobs, see Parallel.py")
+    run_parser.add_argument("--cases", nargs="*", choices=FAMILIES, default=["phi", "size"],
+                            help="families of generated formulae, each for n = 0..max-n")
+    run_parser.add_argument("--max-n", type=int, default=14)
+    run_parser.add_argument("--file", action="append", default=[], help="also run every label of this file")
+    run_parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the trials")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed trials per case")
+    run_parser.add_argument("--timeout", type=float, default=30, help="seconds per case, for all of its runs")
+    run_parser.add_argument("--output", help="JSON file for the results. Default: benchmark-<revision>.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs, flag regressions")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative slowdown of the median that counts as a regression")
+
+    args = arg_parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+    with open(args.old, encoding="utf-8") as old, open(args.new, encoding="utf-8") as new:
+        return 1 if compare(json.load(old), json.load(new), args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+import time
+from collections.abc import Callable
+
+try:
+    import resource
+except ImportError:  # there is none on Windows
+    resource = None
+
+"""
+Limits for a single label, or for a whole batch: wall-clock seconds, expanded nodes, and memory of the process.
+
+Nothing is interrupted from the outside. The engines call spend() once per node they expand (a saturated label, and
+with dpll also every decision), and that raises BudgetExceeded once a limit is reached. The exception unwinds the
+engine, and Reasoner.decide turns it into the third verdict, None: unknown. What the engine counted in a Stats until
+then stays there, what it put into a SatCache is correct, as that only ever gets decided labels.
+
+Nodes are checked on every spend(). The clock only every CLOCK_EVERY nodes, and memory every MEMORY_EVERY, as reading
+them costs more than a node of a small label. Memory is the resident size of the whole process, from /proc where there
+is one (Linux), otherwise the peak so far from getrusage. Without either, memory limits are not checked.
+
+A budget can have a parent, e.g. the budget of the whole batch for that of a label. Nodes count for both, and the
+limits of both are checked.
+
+Whoever else wants to stop a running label (see Server.py) can hand in a cancelled callback. It is asked along with the
+clock, and once it says True the budget is exceeded with the limit "cancel".
+"""
+
+CLOCK_EVERY = 16
+MEMORY_EVERY = 1024
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, limit: str):
+        super().__init__(f"out of {limit}")
+        self.limit = limit  # "time", "nodes", "memory" or "cancel"
+
+
+# resident memory of this process in bytes, None if we cannot tell
+def memory() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux and BSD
+
+
+class Budget:
+    # seconds from now, nodes, bytes. None is no limit
+    def __init__(self, seconds: float | None = None, nodes: int | None = None, memory: int | None = None,
+                 parent: "Budget | None" = None, cancelled: Callable[[], bool] | None = None):
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.max_nodes = nodes
+        self.max_memory = memory
+        self.parent = parent
+        self.cancelled = cancelled
+        self.nodes = 0
+        self.exceeded: str | None = None  # the limit that was reached, once it is
+
+    # one more node. Raises BudgetExceeded if that is one too many
+    def spend(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.__exceed("nodes")
+        self.nodes += 1
+        if self.nodes % CLOCK_EVERY == 0:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                self.__exceed("time")
+            if self.cancelled is not None and self.cancelled():
+                self.__exceed("cancel")
+        if self.nodes % MEMORY_EVERY == 0 and self.max_memory is not None and (memory() or 0) > self.max_memory:
+            self.__exceed("memory")
+        if self.parent is not None:
+            try:
+                self.parent.spend()
+            except BudgetExceeded as e:
+                self.exceeded = e.limit
+                raise
+
+    # all limits at once, without spending anything. E.g. before starting on a label
+    def check(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.__exceed("nodes")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.__exceed("time")
+        if self.cancelled is not None and self.cancelled():
+            self.__exceed("cancel")
+        if self.max_memory is not None and (memory() or 0) > self.max_memory:
+            self.__exceed("memory")
+        if self.parent is not None:
+            try:
+                self.parent.check()
+            except BudgetExceeded as e:
+                self.exceeded = e.limit
+                raise
+
+    # whether check() would pass
+    def left(self) -> bool:
+        try:
+            self.check()
+        except BudgetExceeded:
+            return False
+        return True
+
+    def __exceed(self, limit: str):
+        self.exceeded = limit
+        raise BudgetExceeded(limit)
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from Formula import *
+
+"""
+A memo for satisfiability of labels. The (¬□) rule keeps producing the same successor labels, in one tableau and
+across the labels of a file, so solving each of them only once pays off.
+
+Keys are frozensets of formulae. Formulae are interned, so this is a canonical, order independent form of the label.
+Besides exact hits the cache uses monotonicity of the tableau:
+a superset of an unsatisfiable label is unsatisfiable, and a subset of a satisfiable label is satisfiable.
+"""
+
+
+class SatCache:
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self.entries: OrderedDict[frozenset[Formula], bool] = OrderedDict()  # in LRU order, most recent last
+        # unsatisfiable labels, filed under their smallest formula. A subset of the query has its smallest one in it
+        self.unsat_index: dict[Formula, set[frozenset[Formula]]] = {}
+        # satisfiable labels, filed under every formula. A superset of the query is filed under all of its formulae
+        self.sat_index: dict[Formula, set[frozenset[Formula]]] = {}
+        self.hits = 0  # exact hits
+        self.subset_hits = 0  # answered through an unsatisfiable subset or a satisfiable superset
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # returns the known answer for the label, or None if it still has to be solved
+    def get(self, label: frozenset[Formula]) -> bool | None:
+        result = self.entries.get(label)
+        if result is not None:
+            self.entries.move_to_end(label)
+            self.hits += 1
+            return result
+
+        for formula in label:  # an unsatisfiable subset?
+            for unsat in self.unsat_index.get(formula, ()):
+                if unsat <= label:
+                    self.entries.move_to_end(unsat)
+                    self.subset_hits += 1
+                    return False
+
+        if label:  # a satisfiable superset? It has to contain the rarest formula of the label, so only look there
+            candidates = min((self.sat_index.get(formula, ()) for formula in label), key=len)
+            for sat in candidates:
+                if label <= sat:
+                    self.entries.move_to_end(sat)
+                    self.subset_hits += 1
+                    return True
+
+        self.misses += 1
+        return None
+
+    def put(self, label: frozenset[Formula], result: bool):
+        if self.max_size <= 0:
+            return
+        if label in self.entries:
+            self.entries.move_to_end(label)
+            return
+        self.entries[label] = result
+        if result:
+            for formula in label:
+                self.sat_index.setdefault(formula, set()).add(label)
+        elif label:
+            self.unsat_index.setdefault(min(label, key=hash), set()).add(label)
+        while len(self.entries) > self.max_size:
+            self.__evict()
+
+    def __evict(self):
+        label, result = self.entries.popitem(last=False)
+        self.evictions += 1
+        if result:
+            for formula in label:
+                self.sat_index[formula].discard(label)
+                if not self.sat_index[formula]:
+                    del self.sat_index[formula]
+        elif label:
+            representative = min(label, key=hash)
+            self.unsat_index[representative].discard(label)
+            if not self.unsat_index[representative]:
+                del self.unsat_index[representative]
+
+    def clear(self):
+        self.entries.clear()
+        self.unsat_index.clear()
+        self.sat_index.clear()
+
+    def counters(self) -> dict[str, int]:
+        return {"size": len(self.entries), "hits": self.hits, "subset_hits": self.subset_hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def __str__(self):
+        return ", ".join(f"{name}: {value}" for name, value in self.counters().items())
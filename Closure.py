@@ -0,0 +1,181 @@
+"""
+The (Fischer-Ladner) closure of a label: every sub-formula of its members, together with their negations.
+A tableau started on the label only ever adds formulae from its closure, so we can number the closure once and
+represent labels as integer bitmasks over it. Copying a label is then copying an int, and set operations are bit-ops.
+
+The numbering is chosen such that negation is a shift: the closure has n "base" formulae (everything that is not a Not)
+at the bits 0..n-1, and the negation of base formula i sits at bit i+n. A label clashes iff label & (label >> n) != 0.
+Double negations never show up, negating a Not just strips it. This is the NotNot rule, applied eagerly.
+"""
+
+from Formula import *
+from Formula import _negated
+from Cache import SatCache
+from Heuristics import Heuristic
+from Budget import Budget
+from Stats import Stats
+
+
+# Maps every single bit to a mask, and extends that to arbitrary masks by or-ing the images of all set bits.
+# The images are precomputed per byte of the mask, so an image costs one table lookup per 8 bits, not per set bit
+class MaskMap:
+    def __init__(self, images: dict[int, int]):  # bit index -> image
+        chunks = (max(images) // 8 + 1) if images else 0
+        self.tables: list[list[int]] = []
+        for chunk in range(chunks):
+            table = [0] * 256
+            for byte in range(1, 256):
+                low = byte & -byte  # the lowest set bit, the rest of the byte is already in the table
+                table[byte] = table[byte ^ low] | images.get(chunk * 8 + low.bit_length() - 1, 0)
+            self.tables.append(table)
+
+    def image(self, mask: int) -> int:
+        result = 0
+        for table in self.tables:
+            if not mask:
+                break
+            result |= table[mask & 0xFF]
+            mask >>= 8
+        return result
+
+
+class Closure:
+    def __init__(self, label: set[Formula]):
+        # collect the base formulae iteratively, deep formulae should not hit the recursion limit
+        self.base: list[Formula] = []
+        self.index: dict[Formula, int] = {}  # base formula -> its bit
+        stack = list(label)
+        while stack:
+            formula = stack.pop()
+            if isinstance(formula, Not):
+                formula = formula.sub_formulae[0]
+            if formula not in self.index:
+                self.index[formula] = len(self.base)
+                self.base.append(formula)
+                stack.extend(formula.sub_formulae)
+        self.n = len(self.base)
+        n = self.n
+
+        # ⊤ holds in every world, so it is part of every label. ¬⊤ then clashes like any other negation
+        self.top = 1 << self.index[TOP] if TOP in self.index else 0
+
+        # precompute everything the tableau rules need to know about the formulae
+        self.and_mask = 0  # And formulae, the (∧) rule replaces them by both conjuncts
+        self.not_and_mask = 0  # ¬(φ ∧ ψ), the (¬∧) rule branches into ¬φ and ¬ψ
+        self.box_mask = 0  # □φ, unboxed to φ by the (¬□) rule
+        self.not_box_mask = 0  # ¬□φ, each one gets a successor containing ¬φ
+        conjuncts: dict[int, int] = {}
+        unboxed: dict[int, int] = {}
+        self.branches: dict[int, tuple[int, int]] = {}  # bit of ¬(φ ∧ ψ) -> bits of ¬φ and ¬ψ
+        self.witness: dict[int, int] = {}  # bit of ¬□φ -> bit of ¬φ
+        for i, formula in enumerate(self.base):
+            if isinstance(formula, And):
+                self.and_mask |= 1 << i
+                conjuncts[i] = self.mask(formula.sub_formulae)
+                self.not_and_mask |= 1 << (i + n)
+                self.branches[i + n] = (self.mask([_negated(formula.sub_formulae[0])]),
+                                        self.mask([_negated(formula.sub_formulae[1])]))
+            elif isinstance(formula, Box):
+                self.box_mask |= 1 << i
+                unboxed[i] = self.mask(formula.sub_formulae)
+                self.not_box_mask |= 1 << (i + n)
+                self.witness[i + n] = self.mask([_negated(formula.sub_formulae[0])])
+        self.conjuncts = MaskMap(conjuncts)
+        self.unboxed = MaskMap(unboxed)
+
+    def bit(self, formula: Formula) -> int:
+        if isinstance(formula, Not):
+            return self.index[formula.sub_formulae[0]] + self.n
+        return self.index[formula]
+
+    def mask(self, label) -> int:
+        result = 0
+        for formula in label:
+            result |= 1 << self.bit(formula)
+        return result
+
+    # turn a mask back into a set of formulae. Only needed for output, the tableau never does this
+    def label(self, mask: int) -> set[Formula]:
+        label = set()
+        while mask:
+            low = mask & -mask
+            i = low.bit_length() - 1
+            label.add(self.base[i] if i < self.n else Not(self.base[i - self.n]))
+            mask ^= low
+        return label
+
+
+# the same tableau as Reasoner.successful, just on bitmasks. Call it with normalized labels
+# the cache is shared with the other engines, so (¬□) successors are looked up as sets of formulae, not as masks
+# the heuristic is ignored. Branching goes by the position in the closure, which is what makes the masks cheap
+def successful_bits(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                    heuristic: Heuristic | None = None, budget: Budget | None = None) -> bool:
+    closure = Closure(label)
+    return _successful(closure, closure.mask(label) | closure.top, cache, stats, budget, 0)
+
+
+def _cached_successful(closure: Closure, label: int, cache: SatCache | None, stats: Stats | None,
+                       budget: Budget | None, depth: int) -> bool:
+    if cache is None:
+        return _successful(closure, label, None, stats, budget, depth)
+    key = frozenset(closure.label(label))
+    result = cache.get(key)
+    if result is None:
+        result = _successful(closure, label, cache, stats, budget, depth)
+        cache.put(key, result)
+    return result
+
+
+# with stats: (¬¬) never shows up here, negating a Not just strips it. So only (∧), (¬∧) and (¬□) are counted
+def _successful(closure: Closure, label: int, cache: SatCache | None, stats: Stats | None, budget: Budget | None,
+                depth: int) -> bool:
+    n = closure.n
+    # the non-branching (∧) rule, all And formulae at once, until none are left
+    ands = label & closure.and_mask
+    while ands:
+        if stats is not None:
+            __count(closure, stats, "And", ands, depth)
+        label = (label ^ ands) | closure.conjuncts.image(ands)
+        ands = label & closure.and_mask
+    if stats is not None:
+        stats.node(depth, label.bit_count())
+    if budget is not None:
+        budget.spend()
+
+    clashes = label & (label >> n)
+    if clashes:  # clash: some formula and its negation
+        if stats is not None:
+            stats.clash(depth, closure.base[(clashes & -clashes).bit_length() - 1])
+        return False
+
+    # (¬∧) branching on the lowest ¬(φ ∧ ψ), i.e. the first one in the closure
+    or_branches = label & closure.not_and_mask
+    if or_branches:
+        low = or_branches & -or_branches
+        if stats is not None:
+            __count(closure, stats, "NotAnd", low, depth)
+        label ^= low
+        branch_1, branch_2 = closure.branches[low.bit_length() - 1]
+        return (_successful(closure, label | branch_1, cache, stats, budget, depth + 1)
+                or _successful(closure, label | branch_2, cache, stats, budget, depth + 1))
+
+    # (¬□) one successor per ¬□φ, containing ¬φ and all unboxed □ψ
+    and_branches = label & closure.not_box_mask
+    if stats is not None and not and_branches:
+        stats.open(depth)
+    unboxed = closure.unboxed.image(label & closure.box_mask) | closure.top
+    while and_branches:
+        low = and_branches & -and_branches
+        if stats is not None:
+            __count(closure, stats, "NotBox", low, depth)
+        if not _cached_successful(closure, unboxed | closure.witness[low.bit_length() - 1], cache, stats, budget,
+                                  depth + 1):
+            return False
+        and_branches ^= low
+    return True
+
+
+# one rule application per formula in the mask
+def __count(closure: Closure, stats: Stats, rule: str, mask: int, depth: int):
+    for formula in closure.label(mask):
+        stats.rule(rule, depth, formula)
@@ -0,0 +1,272 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from Formula import *
+import Parser
+
+"""
+Compiled corpora: labels parsed and normalized once, and written to a binary file that loads without the parser.
+
+    python Corpus.py compile input.txt [--out input.kc]
+    python Reasoner.py input.kc
+
+The file is little-endian, and holds the normalized DAG of all its labels at once. Shared sub-formulae are stored once,
+also across labels. After a header of MAGIC and five counts (nodes, atoms, labels, roots, bytes of atom names) come
+these sections, each starting at a multiple of 8 bytes:
+- the line of every label in the input file (8 bytes each), so the answers still say which line they are for
+- where the roots of every label start in the root table, plus where the last one ends (8 bytes each)
+- where the name of every atom starts in the name table, plus where the last one ends (8 bytes each)
+- the first and the second child of every node (4 bytes each, two tables). The first child of an atom is its number
+- the roots of every label: the nodes of its formulae (4 bytes each)
+- the opcode of every node (1 byte each): ATOM, NOT, AND, BOX or TOP. Normal forms have no other connectives
+- the names of the atoms, UTF-8, one after another
+Children always come before their parents. Node numbers are 4 bytes, so a corpus has at most 2^32 distinct nodes.
+
+Loading maps the file into memory, and nothing is read or built until a label is asked for. Then only the nodes of
+that label become Formula objects (interned as always), and they are marked as normal forms, so Reasoner.decide does
+not normalize them again (they are printed in normal form, too). An atom's name is decoded the first time it is
+needed. What is not used is never read from disk, and pages that were read can be dropped again by the OS, so a corpus
+larger than memory is fine.
+
+Compiling keeps one entry per distinct node in memory, but no formulae beyond the current label.
+"""
+
+MAGIC = b"KCORPUS\x01"
+HEADER = struct.Struct("<8s5Q")
+
+ATOM, NOT, AND, BOX, TOP = range(5)
+OPCODES = {Atom: ATOM, Not: NOT, And: AND, Box: BOX, Top: TOP}
+CLASSES = {NOT: Not, AND: And, BOX: Box}
+LITTLE = sys.byteorder == "little"
+
+
+# the next multiple of 8
+def aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+# whether the file is a compiled corpus, and not a text file of labels
+def is_corpus(path: str) -> bool:
+    try:
+        with open(path, mode="rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class CorpusWriter:
+    def __init__(self):
+        self.numbers: dict[tuple[int, int, int], int] = {}  # (opcode, first, second) -> node number
+        self.atoms: dict[str, int] = {}
+        self.ops = bytearray()
+        self.first = array("I")
+        self.second = array("I")
+        self.roots = array("I")
+        self.starts = array("Q", [0])
+        self.lines = array("Q")
+
+    # add a label, given the line it is on. It is normalized here
+    def add(self, line: int, label: set[Formula]):
+        numbers: dict[Formula, int] = {}  # of this label's nodes
+        for formula in {formula.normal_form() for formula in label}:
+            stack = [formula]
+            while stack:  # post-order, so children get their numbers first
+                node = stack[-1]
+                if node in numbers:
+                    stack.pop()
+                    continue
+                missing = [sub_formula for sub_formula in node.sub_formulae if sub_formula not in numbers]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                stack.pop()
+                numbers[node] = self.__number(node, numbers)
+            self.roots.append(numbers[formula])
+        self.starts.append(len(self.roots))
+        self.lines.append(line)
+
+    def __number(self, node: Formula, numbers: dict[Formula, int]) -> int:
+        opcode = OPCODES.get(node.__class__)
+        if opcode is None:
+            raise ValueError(f"{node.__class__.__name__} is not in normal form")
+        if opcode == ATOM:
+            key = (ATOM, self.atoms.setdefault(node.name, len(self.atoms)), 0)
+        else:
+            children = [numbers[sub_formula] for sub_formula in node.sub_formulae] + [0, 0]
+            key = (opcode, children[0], children[1])
+        number = self.numbers.get(key)
+        if number is None:
+            number = len(self.ops)
+            if number >= 2 ** 32:
+                raise ValueError("more than 2^32 distinct sub-formulae, split the input into several corpora")
+            self.numbers[key] = number
+            self.ops.append(opcode)
+            self.first.append(key[1])
+            self.second.append(key[2])
+        return number
+
+    def write(self, path: str):
+        names = array("Q", [0])
+        encoded = bytearray()
+        for name in self.atoms:  # in the order of their numbers
+            encoded += name.encode("utf-8")
+            names.append(len(encoded))
+        with open(path, mode="wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self.ops), len(self.atoms), len(self.lines), len(self.roots),
+                                len(encoded)))
+            for section in (self.lines, self.starts, names, self.first, self.second, self.roots, self.ops, encoded):
+                if isinstance(section, array) and not LITTLE:
+                    section = array(section.typecode, section)
+                    section.byteswap()
+                f.write(section)
+                f.write(bytes(aligned(f.tell()) - f.tell()))
+
+
+# compile a text file of labels. Returns the number of labels and of distinct nodes. Lines that cannot be parsed are
+# left out, with a message on stderr
+def compile_file(source: str, target: str) -> tuple[int, int]:
+    writer = CorpusWriter()
+
+    def skipped(n: int, message: str):
+        print(f"{source}, line {n}: {message}, left out", file=sys.stderr)
+
+    for line, label in Parser.iter_file(source, skipped):
+        writer.add(line, label)
+    writer.write(target)
+    return len(writer.lines), len(writer.ops)
+
+
+class Corpus:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, mode="rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled corpus")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, nodes, atoms, labels, roots, name_bytes = HEADER.unpack_from(self.map)
+        self.view = memoryview(self.map)
+        self.offset = HEADER.size
+        self.lines = self.__section("Q", labels)
+        self.starts = self.__section("Q", labels + 1)
+        self.names = self.__section("Q", atoms + 1)
+        self.first = self.__section("I", nodes)
+        self.second = self.__section("I", nodes)
+        self.roots = self.__section("I", roots)
+        self.ops = self.__section("B", nodes)
+        self.encoded = self.__section("B", name_bytes)
+        self.atoms: dict[int, str] = {}  # the names decoded so far
+
+    # the next count items of the format. A view into the file, except on big-endian machines
+    def __section(self, fmt: str, count: int) -> memoryview | array:
+        start = self.offset
+        end = start + count * struct.calcsize(fmt)
+        if end > len(self.map):
+            raise ValueError(f"{self.path} is truncated")
+        self.offset = aligned(end)
+        if fmt == "B":
+            return self.view[start:end]
+        if not LITTLE:
+            section = array(fmt, self.view[start:end])
+            section.byteswap()
+            return section
+        return self.view[start:end].cast(fmt)
+
+    def __len__(self):
+        return len(self.lines)
+
+    # the line of the i-th label in the file it was compiled from
+    def line(self, i: int) -> int:
+        return self.lines[i]
+
+    def atom(self, number: int) -> str:
+        name = self.atoms.get(number)
+        if name is None:
+            name = self.atoms[number] = str(self.encoded[self.names[number]:self.names[number + 1]], "utf-8")
+        return name
+
+    # the i-th label, normalized already. Only its own nodes are built
+    def label(self, i: int) -> set[Formula]:
+        roots = self.roots[self.starts[i]:self.starts[i + 1]]
+        ops, first, second = self.ops, self.first, self.second
+        needed = set(roots)
+        stack = list(needed)
+        while stack:
+            number = stack.pop()
+            opcode = ops[number]
+            if opcode == AND or opcode == NOT or opcode == BOX:
+                child = first[number]
+                if child not in needed:
+                    needed.add(child)
+                    stack.append(child)
+                if opcode == AND and second[number] not in needed:
+                    needed.add(second[number])
+                    stack.append(second[number])
+        built: dict[int, Formula] = {}
+        for number in sorted(needed):  # children come before their parents
+            opcode = ops[number]
+            if opcode == ATOM:
+                formula = Atom(self.atom(first[number]))
+            elif opcode == AND:
+                formula = And(built[first[number]], built[second[number]])
+            elif opcode == TOP:
+                formula = Top()
+            else:
+                formula = CLASSES[opcode](built[first[number]])
+            known_normal(formula)
+            built[number] = formula
+        return {built[root] for root in roots}
+
+    # (line, label) pairs, like Parser.iter_file
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.line(i), self.label(i)
+
+    def counters(self) -> dict[str, int]:
+        return {"labels": len(self), "nodes": len(self.ops), "atoms": len(self.names) - 1, "roots": len(self.roots),
+                "bytes": len(self.map)}
+
+    def close(self):
+        for section in (self.lines, self.starts, self.names, self.first, self.second, self.roots, self.ops,
+                        self.encoded, self.view):
+            if isinstance(section, memoryview):
+                section.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# the labels of a compiled corpus as (line, label) pairs, like Parser.iter_file
+def iter_corpus(path: str):
+    with Corpus(path) as corpus:
+        yield from corpus
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compiles labels into a binary corpus that loads without parsing")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="parse and normalize a text file of labels once")
+    compile_parser.add_argument("file", help="input file, containing one label per line")
+    compile_parser.add_argument("--out", help="file to write. Default: the input file with .kc instead of .txt")
+
+    info_parser = commands.add_parser("info", help="counts of a compiled corpus")
+    info_parser.add_argument("file")
+
+    args = arg_parser.parse_args()
+    if args.command == "compile":
+        out = args.out or os.path.splitext(args.file)[0] + ".kc"
+        start = time.perf_counter()
+        labels, nodes = compile_file(args.file, out)
+        print(f"{out}: {labels} labels, {nodes} distinct nodes, {os.path.getsize(out)} bytes, "
+              f"{time.perf_counter() - start:.2f}s")
+    else:
+        with Corpus(args.file) as corpus:
+            print(", ".join(f"{name}: {value}" for name, value in corpus.counters().items()))
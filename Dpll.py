@@ -0,0 +1,393 @@
+from Formula import *
+from Formula import _negated
+from Cache import SatCache
+from Heuristics import Heuristic
+from Budget import Budget
+from Stats import Stats
+
+"""
+A tableau that decides the propositional part of each world with DPLL (conflict driven clause learning), instead of
+the syntactic (¬∧) rule of Reasoner.successful.
+
+The formulae of a world are turned into clauses over literals. A literal is a formula, or the negation of one, that is
+not a negation itself. Atoms, □φ and ⊤ are the propositional variables, and every conjunction gets a variable too,
+standing for the conjunction itself (Tseitin, but only in the polarity it occurs in, i.e. Plaisted-Greenbaum):
+    φ ∧ ψ occurs positively:  ¬(φ ∧ ψ) ∨ φ   and   ¬(φ ∧ ψ) ∨ ψ
+    φ ∧ ψ occurs negatively:  (φ ∧ ψ) ∨ ¬φ ∨ ¬ψ
+The formulae of the label itself, and ⊤, are unit clauses. The first literal of a clause is its head, the clause only
+matters once the head is false, i.e. once the conjunction is in the label. So only those are branched on, and
+conjunctions nobody needs stay unassigned.
+
+Branching is semantic: the solver decides ¬φ for a clause ¬(φ ∧ ψ), and if that fails, the learned clause brings in φ,
+which makes ¬ψ a unit. The branches do not overlap, unlike ¬φ and ¬ψ of the tableau, which both allow ¬φ ∧ ¬ψ.
+Unit clauses are propagated over two watched literals per clause. A conflict is analysed back to its first unique
+implication point, the clause learned from it stays for the rest of the world, and the search jumps back to where
+that clause becomes a unit.
+
+Once every clause whose head is false is satisfied, the assignment is propositionally consistent, and the (¬□) rule
+takes over: every ¬□φ in it gets a successor with ¬φ and all ψ of the □ψ in it, each decided by a World of its own.
+If one of them is unsatisfiable, so is this combination of boxes, and that is learned as a clause as well:
+□φ ∨ ¬□ψ_1 ∨ ... ∨ ¬□ψ_n. The search then continues for another assignment. Learned clauses only ever hold in their
+own world, so they are dropped with it.
+
+A world can be solved again under other assumptions (see Session.py): formulae that are decided first, each on a
+decision level of its own, instead of being units of the label. Everything on level 0 stays, and so do the learned
+clauses. They follow from the clauses alone (conflict analysis keeps the assumptions it used as literals), and those
+are either the label or hold anyway: a conjunction's variable stands for the conjunction itself, and the clauses from
+the (¬□) rule are valid in K.
+
+An unsatisfiable world also tells which formulae of its label it actually needed for that, its core. Every learned
+clause remembers the formulae of the label it was derived from (conflict analysis leaves out what is true on level 0,
+so that has to be kept track of separately), and the final conflict collects them. Only the □ψ whose ψ are in the core
+of a successor go into the clause above, which makes it a lot stronger.
+
+A Heuristic (see Heuristics.py) only decides the order of the (¬□) successors here, and learns how they turned out.
+The literals to decide are chosen as below, clause learning already does what the (¬∧) heuristics try to.
+"""
+
+
+class World:
+    def __init__(self, label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                 heuristic: Heuristic | None = None, budget: Budget | None = None, depth: int = 0):
+        self.cache = cache
+        self.stats = stats
+        self.heuristic = heuristic
+        self.budget = budget  # spent on every decision and every (¬□) expansion
+        self.depth = depth  # branching points above this world, for the stats
+        self.negation: dict[Formula, Formula] = {}  # literal -> the opposite literal, for all literals we know of
+        # clauses of the label with more than two literals, head first, as they were made. Binary ones are units as soon
+        # as their head is false, so they never need a decision
+        self.clauses: list[tuple[Formula, ...]] = []
+        self.watches: dict[Formula, list[list[Formula]]] = {}  # literal -> clauses that watch it (first two)
+        self.level: dict[Formula, int] = {}  # true literal -> decision level it was set on
+        self.reason: dict[Formula, list[Formula] | None] = {}  # true literal -> the clause that implied it
+        self.trail: list[Formula] = []  # the true literals, in the order they were set
+        self.decisions: list[int] = []  # trail length at each decision
+        self.head = 0  # trail literals before this one are propagated
+        self.saved: set[Formula] = set()  # literals that were true when they were last unassigned
+        self.label = label
+        # id of a learned clause -> formulae of the label it depends on. Learned clauses stay until the world is done
+        self.cores: dict[int, frozenset[Formula]] = {}
+        self.units: dict[Formula, frozenset[Formula]] = {}  # the same for literals on level 0
+        self.core: frozenset[Formula] | None = None  # a part of the label that is unsatisfiable on its own, once known
+        # (¬□) successors solved in this world, with their core if they are unsatisfiable and we know it
+        self.successors: dict[frozenset[Formula], tuple[bool, frozenset[Formula] | None]] = {}
+        self.defined: set[tuple[Formula, bool]] = set()  # (formula, polarity) that have their clauses
+        self.consistent = self.__encode(label)  # False once the label is known to be unsatisfiable
+
+    # the literal with its opposite
+    def __complement(self, literal: Formula) -> Formula:
+        opposite = self.negation.get(literal)
+        if opposite is None:
+            opposite = _negated(literal)
+            self.negation[literal] = opposite
+            self.negation[opposite] = literal
+        return opposite
+
+    # clauses for the label. Returns False if the units already clash
+    def __encode(self, label: set[Formula]) -> bool:
+        for formula in label:
+            self.define(formula)
+        for literal in label:
+            if self.value(literal) is False:
+                if self.stats is not None:
+                    self.stats.clash(self.depth, literal)
+                self.core = self.__core(self.negation[literal]).union((literal,))
+                return False
+            if literal not in self.level:
+                self.__assign(literal, None)
+        return True
+
+    # add the clauses for a formula (in normal form), so it can be used as a literal. Goes back to level 0 for that
+    def define(self, formula: Formula):
+        self.backtrack(0)
+        stack = [(formula, True)]
+        while stack:
+            formula, positive = stack.pop()
+            if (formula, positive) in self.defined:
+                continue
+            self.defined.add((formula, positive))
+            if isinstance(formula, Not):
+                stack.append((formula.sub_formulae[0], not positive))
+                continue
+            negated = self.__complement(formula)
+            if isinstance(formula, Top):
+                if formula not in self.level:  # ¬⊤ can only be set after this, as it defines ⊤ first
+                    self.__assign(formula, None)
+            elif isinstance(formula, And):
+                conj_1, conj_2 = formula.sub_formulae
+                if positive:
+                    self.__add_clause([negated, conj_1])
+                    self.__add_clause([negated, conj_2])
+                else:
+                    self.__add_clause([formula, self.__complement(conj_1), self.__complement(conj_2)])
+                stack.append((conj_1, positive))
+                stack.append((conj_2, positive))
+
+    def __add_clause(self, clause: list[Formula]):
+        clause = list(dict.fromkeys(clause))  # φ ∧ φ gives the same literal twice
+        if any(self.__complement(literal) in clause for literal in clause):
+            return  # φ ∧ ¬φ, always satisfied
+        if len(clause) > 2:
+            self.clauses.append(tuple(clause))
+        if not self.trail:
+            self.__watch(clause)
+            return
+        # the world was solved before, so some literals are set on level 0 already. Watch the ones that are not false,
+        # propagation only looks at a clause again when a watched literal becomes false
+        clause.sort(key=lambda literal: 0 if literal in self.level else 1 if self.negation[literal] not in self.level
+                    else 2)
+        self.__watch(clause)
+        if self.negation[clause[0]] in self.level:
+            self.consistent = False  # cannot happen, unless the label is unsatisfiable anyway
+        elif clause[0] not in self.level and self.negation[clause[1]] in self.level:
+            self.__assign(clause[0], clause)
+
+    def __watch(self, clause: list[Formula]):
+        self.watches.setdefault(clause[0], []).append(clause)
+        self.watches.setdefault(clause[1], []).append(clause)
+
+    # True, False, or None while it is unassigned
+    def value(self, literal: Formula) -> bool | None:
+        if literal in self.level:
+            return True
+        if self.negation[literal] in self.level:
+            return False
+        return None
+
+    def __assign(self, literal: Formula, reason: list[Formula] | None):
+        self.level[literal] = len(self.decisions)
+        self.reason[literal] = reason
+        self.trail.append(literal)
+
+    # unit propagation. Returns a clause with only false literals, or None if there is none
+    def propagate(self) -> list[Formula] | None:
+        while self.head < len(self.trail):
+            false = self.negation[self.trail[self.head]]
+            self.head += 1
+            watching = self.watches.get(false)
+            if not watching:
+                continue
+            kept = []  # the clauses that keep watching it
+            for i, clause in enumerate(watching):
+                if clause[0] is false:  # the false one goes second
+                    clause[0], clause[1] = clause[1], clause[0]
+                if clause[0] in self.level:  # satisfied anyway
+                    kept.append(clause)
+                    continue
+                for j in range(2, len(clause)):  # another literal that is not false, to watch instead
+                    if self.negation[clause[j]] not in self.level:
+                        clause[1], clause[j] = clause[j], clause[1]
+                        self.watches.setdefault(clause[1], []).append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if self.negation[clause[0]] in self.level:
+                        kept.extend(watching[i + 1:])
+                        self.watches[false] = kept
+                        return clause
+                    self.__assign(clause[0], clause)
+                    if self.stats is not None:
+                        self.stats.propagate(self.depth + len(self.decisions), clause[0])
+            self.watches[false] = kept
+        return None
+
+    # the formulae of the label a literal on level 0 follows from
+    def __core(self, literal: Formula) -> frozenset[Formula]:
+        stack = [literal]
+        while stack:  # post-order over the reasons, like Formula.normal_form
+            literal = stack[-1]
+            if literal in self.units:
+                stack.pop()
+                continue
+            reason = self.reason[literal]
+            if reason is None:  # a unit of the label, or ⊤
+                self.units[literal] = frozenset((literal,)) if literal in self.label else frozenset()
+                stack.pop()
+                continue
+            causes = [self.negation[other] for other in reason if other is not literal]
+            missing = [cause for cause in causes if cause not in self.units]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            self.units[literal] = self.cores.get(id(reason), frozenset()).union(
+                *[self.units[cause] for cause in causes])
+        return self.units[literal]
+
+    # the first unique implication point of a conflict on the current decision level. Returns the learned clause,
+    # with the literal that becomes a unit first and the one with the next highest level second, and that level
+    def analyze(self, conflict: list[Formula]) -> tuple[list[Formula], int]:
+        learned = [conflict[0]]  # placeholder for the unit
+        core: set[Formula] = set()
+        seen: set[Formula] = set()
+        current = len(self.decisions)
+        open_literals = 0  # literals of the current level still to resolve
+        literal = None
+        index = len(self.trail) - 1
+        clause = conflict
+        while True:
+            core.update(self.cores.get(id(clause), ()))
+            for other in clause:
+                if other is literal:
+                    continue
+                true = self.negation[other]
+                if self.level[true] == 0:
+                    core.update(self.__core(true))
+                elif true not in seen:
+                    seen.add(true)
+                    if self.level[true] == current:
+                        open_literals += 1
+                    else:
+                        learned.append(other)
+            while self.trail[index] not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            open_literals -= 1
+            if open_literals == 0:
+                break
+            clause = self.reason[literal]
+        learned[0] = self.negation[literal]
+        self.cores[id(learned)] = frozenset(core)
+        if len(learned) == 1:
+            return learned, 0
+        second = max(range(1, len(learned)), key=lambda k: self.level[self.negation[learned[k]]])
+        learned[1], learned[second] = learned[second], learned[1]
+        return learned, self.level[self.negation[learned[1]]]
+
+    def backtrack(self, level: int):
+        if len(self.decisions) <= level:
+            return
+        mark = self.decisions[level]
+        for literal in self.trail[mark:]:
+            del self.level[literal]
+            del self.reason[literal]
+            self.saved.discard(self.negation[literal])
+            self.saved.add(literal)
+        del self.trail[mark:]
+        del self.decisions[level:]
+        self.head = mark
+
+    # learn from a clause whose literals are all false. Returns False if the world is unsatisfiable
+    def learn(self, conflict: list[Formula]) -> bool:
+        if self.stats is not None:
+            self.stats.clash(self.depth + len(self.decisions), self.negation[conflict[0]])
+        level = max(self.level[self.negation[literal]] for literal in conflict)
+        if level == 0:
+            self.core = self.cores.get(id(conflict), frozenset()).union(
+                *[self.__core(self.negation[literal]) for literal in conflict])
+            return False
+        self.backtrack(level)  # a clause from the (¬□) rule may be false since an earlier level already
+        learned, level = self.analyze(conflict)
+        self.backtrack(level)
+        if len(learned) > 1:
+            self.__watch(learned)
+        self.__assign(learned[0], learned)
+        if self.stats is not None:
+            self.stats.learn(self.depth + level)
+        return True
+
+    # the literal to branch on next: of a clause that is needed but not satisfied yet, the negated conjunct that is
+    # the smallest formula. None if there is no such clause, i.e. the assignment is propositionally consistent
+    # Literals that were true before they were backtracked over come first (phase saving). The search then returns to
+    # the assignment it had, as far as that is still possible. In particular solving again under new assumptions finds
+    # the last model again, with the same (¬□) successors, if they do not contradict it
+    def decide(self) -> Formula | None:
+        for clause in self.clauses:
+            if self.negation[clause[0]] not in self.level:
+                continue  # unassigned, nothing depends on it. Or true, then the clause is satisfied
+            best = None
+            for literal in clause[1:]:
+                if literal in self.level:
+                    break
+                if self.negation[literal] not in self.level and (
+                        best is None or (literal not in self.saved, literal.size) < (best not in self.saved, best.size)):
+                    best = literal
+            else:
+                if best is not None:
+                    return best
+        return None
+
+    # the (¬□) rule on a consistent assignment. Returns the clause to learn if a successor is unsatisfiable
+    def expand(self) -> list[Formula] | None:
+        depth = self.depth + len(self.decisions)
+        if self.stats is not None:
+            self.stats.node(depth, len(self.trail))
+        if self.budget is not None:
+            self.budget.spend()
+        boxes = [literal for literal in self.trail if isinstance(literal, Box)]
+        witnesses = [literal for literal in self.trail if literal.applicable_tableaux_rule == "NotBox"]
+        # as a crude heuristic we branch on the smallest formula first, see Reasoner.successful
+        if self.heuristic is None:
+            witnesses.sort(key=lambda f: f.size)
+        else:
+            witnesses = self.heuristic.and_order(witnesses)
+        unboxed = frozenset(box.sub_formulae[0] for box in boxes)
+        for witness in witnesses:
+            if self.stats is not None:
+                self.stats.rule("NotBox", depth, witness)
+            label = unboxed.union((Not(witness.sub_formulae[0].sub_formulae[0]).normal_form(),))
+            satisfiable, core = self.__successful(label, depth + 1)
+            if self.heuristic is not None:
+                self.heuristic.successor(witness, satisfiable)
+            if not satisfiable:  # without a core, e.g. from the cache, all of the boxes are to blame
+                return [self.negation[witness]] + [self.negation[box] for box in boxes
+                                                   if core is None or box.sub_formulae[0] in core]
+        if self.stats is not None:
+            self.stats.open(depth)
+        return None
+
+    # whether the successor is satisfiable, and its core if it is not
+    def __successful(self, label: frozenset[Formula], depth: int) -> tuple[bool, frozenset[Formula] | None]:
+        known = self.successors.get(label)
+        if known is not None:
+            return known
+        result = self.cache.get(label) if self.cache is not None else None
+        if result is not None:
+            known = result, None
+        else:
+            world = World(set(label), self.cache, self.stats, self.heuristic, self.budget, depth)
+            result = world.solve()
+            if self.cache is not None:
+                self.cache.put(label, result)
+            known = result, world.core
+        self.successors[label] = known
+        return known
+
+    # whether the label is satisfiable together with the assumptions, which have to be defined first
+    def solve(self, assumptions: list[Formula] = ()) -> bool:
+        self.backtrack(0)
+        while self.consistent:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.consistent = self.learn(conflict)
+                continue
+            if len(self.decisions) < len(assumptions):
+                literal = assumptions[len(self.decisions)]
+                if self.value(literal) is False:
+                    return False
+                self.decisions.append(len(self.trail))
+                if literal not in self.level:  # else the level stays empty, the next assumption still gets its own
+                    self.__assign(literal, None)
+                continue
+            literal = self.decide()
+            if literal is not None:
+                if self.budget is not None:
+                    self.budget.spend()
+                self.decisions.append(len(self.trail))
+                self.__assign(literal, None)
+                if self.stats is not None:
+                    self.stats.decide(self.depth + len(self.decisions), literal)
+                continue
+            conflict = self.expand()
+            if conflict is None:
+                return True
+            self.consistent = self.learn(conflict)
+        return False
+
+
+# same answers as Reasoner.successful. Call it with normalized labels
+def successful_dpll(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                    heuristic: Heuristic | None = None, budget: Budget | None = None) -> bool:
+    return World(label, cache, stats, heuristic, budget).solve()
@@ -2,59 +2,180 @@
 Formula is essentially an abstract superclass for the recursive syntax-tree (https://en.wikipedia.org/wiki/Parse_tree)
 sub-formulae are the sub-formulae (duh) one for Not and Box; two for And
 applicable_tableaux_rule gives easier access and will allow a match-case construct
-size is the number of logical connectives in the formula. A crude heuristic which branch to choose first
+size is the number of logical connectives in the formula, modal_depth the nesting depth of its Box and Diamond.
+Both are computed once, from those of the sub-formulae, when the node is built. They are what the branching
+heuristics go by, see Heuristics.py
 normal_form removes double negations, as well as Diamond, or, -> and alike. Please use it before reasoning.
 
+Formulae are hash-consed: the constructors look up an intern table first, so structurally identical (sub-)formulae
+are the very same object. The syntax-tree is therefore really a DAG, and every node gets an integer id, counting up.
+Nodes are immutable after construction, normal_form returns new (interned) nodes instead of changing the old ones.
+The intern table holds on to every node: with weak references, nodes that are only built for a moment (¬φ to look
+something up, ⊤ for a clash check) were freed right away and built again, with a new id, every time. Over a long
+stream of labels forget_formulae empties the table again. TOP and BOT (¬⊤) are built once and kept for good.
+
+Nothing here recurses, so formulae of any depth are fine:
+normal_form walks the DAG with an explicit stack, and remembers the normal form in every node it passes. Shared
+sub-formulae are normalized only once, and asking again later is free.
+__str__ is rendered on demand from a template per class, again with an explicit stack. Nodes keep no string around.
+
 Formula implements:
-__eq__   so comparisons with == (or "in") are possible
+__eq__   identity, which is the same as structural equality thanks to the interning. O(1)
 __str__  to print a canonical form (using unicode for the logical symbols)
-__hash__ to allow sets of formulae
+__hash__ the id, so sets of formulae hash in O(1) as well
 
 The available subclasses are:
-Atom, Not, And, Box, Or, Implication, BiImplication, Diamond
+Atom, Not, And, Box, Or, Implication, BiImplication, Diamond, Top, Bot
 They all take one or two Formulas as argument, depending on whether they are unary or binary.
-Except for Atom, which takes a string as its name
+Except for Atom, which takes a string as its name, and Top/Bot which take nothing
 """
 
+import itertools
 
-# The abstract superclass. Don't make an object of this type, use its subclasses
-class Formula:
-    def __init__(self):
-        self.sub_formulae = []
-        self.applicable_tableaux_rule = None
-        self.size = 1
-        self.str = ""
+# remembered as the normal form of formulae that are in normal form already. The node itself would be a ref-cycle
+_ITSELF = object()
 
-    def normal_form(self):
-        return self
 
-    def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
-        else:
-            return False
+# The abstract superclass. Don't make an object of this type, use its subclasses
+class Formula:
+    __slots__ = ("id", "sub_formulae", "applicable_tableaux_rule", "size", "modal_depth", "normal", "__weakref__")
+
+    # (class, ids of the sub-formulae or the atom name) -> the one node with that structure
+    __interned: dict[tuple, "Formula"] = {}
+    __ids = itertools.count()
+
+    def __new__(cls, *args):
+        key = (cls, *[arg.id if isinstance(arg, Formula) else arg for arg in args])
+        node = Formula.__interned.get(key)
+        if node is None:  # first time we see this formula, actually build it
+            node = object.__new__(cls)
+            node.id = next(Formula.__ids)
+            node.sub_formulae = tuple(arg for arg in args if isinstance(arg, Formula))
+            node.applicable_tableaux_rule = None
+            # as in a tree, shared sub-formulae count once per occurrence
+            node.size = sum(sub_formula.size for sub_formula in node.sub_formulae) + bool(node.sub_formulae)
+            node.modal_depth = cls._modal + max((sub_formula.modal_depth for sub_formula in node.sub_formulae),
+                                                default=0)
+            node.normal = None  # not computed yet
+            node._setup(*args)
+            Formula.__interned[key] = node
+        return node
+
+    # the number of distinct formulae in the intern table
+    @staticmethod
+    def interned() -> int:
+        return len(Formula.__interned)
+
+    # empties the intern table, except for the nodes to keep. See forget_formulae
+    @staticmethod
+    def _forget(keep: tuple["Formula", ...]):
+        Formula.__interned = {key: node for key, node in Formula.__interned.items() if node in keep}
+
+    # called exactly once per distinct formula. Subclasses fill in their rule here
+    def _setup(self, *args):
+        pass
+
+    def normal_form(self) -> "Formula":
+        stack = [self]
+        while stack:  # post-order: a node is normalized once all of its sub-formulae are
+            formula = stack[-1]
+            if formula.normal is not None:
+                stack.pop()
+                continue
+            missing = [sub_formula for sub_formula in formula.sub_formulae if sub_formula.normal is None]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            normal = formula._normalize(*[sub_formula.normal_form() for sub_formula in formula.sub_formulae])
+            formula.normal = _ITSELF if normal is formula else normal
+        return self if self.normal is _ITSELF else self.normal
+
+    # the normal form of this node, given the normal forms of its sub-formulae. By default just the same connective
+    def _normalize(self, *normal_subs: "Formula") -> "Formula":
+        return self.__class__(*normal_subs)
+
+    # 1 for the modal operators, they add to the modal depth
+    _modal = 0
+
+    # how the node is printed: strings as they are, an int i stands for the i-th sub-formula
+    _template: tuple[str | int, ...] = ()
+
+    # __eq__ is inherited from object, i.e. identity. Two equal formulae are one object, so that is all we need
 
     def __hash__(self):
-        return hash(self.__str__())
+        return self.id
+
+    # copy and pickle have to go through the constructor again, otherwise the copy would not be interned
+    def __reduce__(self):
+        return self.__class__, self.sub_formulae
 
     def __str__(self):
-        return self.str  # computing str bottom up prevents recursion. May take some memory though
+        # pieces are collected left to right and joined once. Pasting the strings of the sub-formulae together would
+        # copy them again on every level, i.e. take quadratic time on deep formulae
+        pieces: list[str] = []
+        stack: list[Formula | str] = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                pieces.append(item)
+            else:
+                stack.extend(item.sub_formulae[part] if isinstance(part, int) else part
+                             for part in reversed(item._template))
+        return "".join(pieces)
+
+# for whoever builds formulae that are known to be in normal form already, bottom-up (see Corpus.py). normal_form then
+# does not walk them again
+def known_normal(formula: Formula):
+    if formula.normal is None:
+        formula.normal = _ITSELF
+
+
+# ¬φ without a double negation, for formulae φ in normal form
+def _negated(formula: Formula) -> Formula:
+    return formula.sub_formulae[0] if isinstance(formula, Not) else Not(formula)
+
+
+# the number of distinct sub-formulae of the label, i.e. how large the tableau can get. Every node counts once, however
+# often it is shared (unlike size)
+def closure_size(label: set[Formula]) -> int:
+    seen = set()
+    stack = list(label)
+    while stack:
+        formula = stack.pop()
+        if formula not in seen:
+            seen.add(formula)
+            stack.extend(formula.sub_formulae)
+    return len(seen)
 
 
 class Atom(Formula):
-    def __init__(self, name:str):
-        super().__init__()
+    __slots__ = ("name",)
+
+    def __new__(cls, name: str):
+        return super().__new__(cls, name)
+
+    def _setup(self, name: str):
         self.name = name
-        self.str = self.name
 
-    # def __str__(self):
-    #     return self.name
+    def _normalize(self):
+        return self
+
+    @property
+    def _template(self):
+        return (self.name,)
+
+    def __reduce__(self):
+        return Atom, (self.name,)
 
 
 class Not(Formula):
-    def __init__(self, neg: Formula):
-        super().__init__()
-        self.sub_formulae = [neg]
+    __slots__ = ()
+
+    def __new__(cls, neg: Formula):
+        return super().__new__(cls, neg)
+
+    def _setup(self, neg: Formula):
         if isinstance(neg, Not):
             self.applicable_tableaux_rule = "NotNot"
         elif isinstance(neg, And):
@@ -63,119 +184,113 @@ class Not(Formula):
             self.applicable_tableaux_rule = "NotBox"
         else:
             self.applicable_tableaux_rule = None
-        self.str = f"\u00AC {self.sub_formulae[0]!s}"
 
-    def normal_form(self):  # remove double negation at parse-time
-        self.sub_formulae[0] = self.sub_formulae[0].normal_form()
-        # self.str = f"\u00AC {self.sub_formulae[0]!s}"  no need to update str, we return a new object anyway
-        if isinstance(self.sub_formulae[0], Not):
-            return self.sub_formulae[0].sub_formulae[0]  # this has already been normalized
-        else:  # normal form may create instances of "NotAnd" or "NotBox" rules, creating a new object detects that
-            return Not(self.sub_formulae[0])
+    def _normalize(self, neg: Formula):  # remove double negation at parse-time
+        # normal form may create instances of "NotAnd" or "NotBox" rules, the new node knows its rule
+        return _negated(neg)
 
-    # def __str__(self):
-    #     return f"\u00AC {self.sub_formulae[0]!s}"
+    _template = ("\u00AC ", 0)
 
 
 class And(Formula):
-    def __init__(self, conj_1: Formula, conj_2: Formula):
-        super().__init__()
-        self.sub_formulae = [conj_1, conj_2]
-        self.applicable_tableaux_rule = "And"
-        self.str = f"( {self.sub_formulae[0]!s} \u2227 {self.sub_formulae[1]!s} )"
+    __slots__ = ()
 
-    def normal_form(self):  # remove double negation at parse-time
-        self.sub_formulae[0] = self.sub_formulae[0].normal_form()
-        self.sub_formulae[1] = self.sub_formulae[1].normal_form()
-        self.str = f"( {self.sub_formulae[0]!s} \u2227 {self.sub_formulae[1]!s} )"  # update str
-        return self
+    def __new__(cls, conj_1: Formula, conj_2: Formula):
+        return super().__new__(cls, conj_1, conj_2)
 
-    # def __str__(self):
-    #     return f"( {self.sub_formulae[0]!s} \u2227 {self.sub_formulae[1]!s} )"
+    def _setup(self, conj_1: Formula, conj_2: Formula):
+        self.applicable_tableaux_rule = "And"
+
+    _template = ("( ", 0, " \u2227 ", 1, " )")
 
 
 class Box(Formula):
-    def __init__(self, boxed: Formula):
-        super().__init__()
-        self.sub_formulae = [boxed]
-        self.applicable_tableaux_rule = None
-        self.str = f"\u25FB {self.sub_formulae[0]!s}"
-
-    def normal_form(self):
-        self.sub_formulae[0] = self.sub_formulae[0].normal_form()
-        self.str = f"\u25FB {self.sub_formulae[0]!s}"  # update str
-        return self
+    __slots__ = ()
+
+    def __new__(cls, boxed: Formula):
+        return super().__new__(cls, boxed)
 
-    # def __str__(self):
-    #     return f"\u25FB {self.sub_formulae[0]!s}"
+    _modal = 1
+
+    _template = ("\u25FB ", 0)
 
 
 class Or(Formula):
-    def __init__(self, disj_1: Formula, disj_2: Formula):
-        super().__init__()
-        self.sub_formulae = [disj_1, disj_2]
-        self.applicable_tableaux_rule = None
-        self.str = f"{self.sub_formulae[0]!s} \u2228 {self.sub_formulae[1]!s}"
+    __slots__ = ()
+
+    def __new__(cls, disj_1: Formula, disj_2: Formula):
+        return super().__new__(cls, disj_1, disj_2)
 
-    def normal_form(self):  # A \/ B = ~(~A /\ ~B)
-        return Not(And(Not(self.sub_formulae[0]), Not(self.sub_formulae[1]))).normal_form()
+    def _normalize(self, disj_1: Formula, disj_2: Formula):  # A \/ B = ~(~A /\ ~B)
+        return Not(And(_negated(disj_1), _negated(disj_2)))
 
-    # def __str__(self):
-    #     return f"{self.sub_formulae[0]!s} \u2228 {self.sub_formulae[1]!s}"
+    _template = ("( ", 0, " \u2228 ", 1, " )")
 
 
 class Implication(Formula):
-    def __init__(self, premise: Formula, conclusion: Formula):
-        super().__init__()
-        self.sub_formulae = [premise, conclusion]
-        self.applicable_tableaux_rule = None
-        self.str = f"( {self.sub_formulae[0]!s} \u2192 {self.sub_formulae[1]!s} )"
+    __slots__ = ()
 
-    def normal_form(self):  # A -> B = ~A \/ B = ~(~(~A) /\ ~B = ~(A /\ ~B)
-        return Not(And(self.sub_formulae[0], Not(self.sub_formulae[1]))).normal_form()
+    def __new__(cls, premise: Formula, conclusion: Formula):
+        return super().__new__(cls, premise, conclusion)
 
-    # def __str__(self):
-    #     return f"( {self.sub_formulae[0]!s} \u2192 {self.sub_formulae[1]!s} )"
+    def _normalize(self, premise: Formula, conclusion: Formula):  # A -> B = ~A \/ B = ~(~(~A) /\ ~B = ~(A /\ ~B)
+        return Not(And(premise, _negated(conclusion)))
+
+    _template = ("( ", 0, " \u2192 ", 1, " )")
 
 
 class BiImplication(Formula):
-    def __init__(self, eq_1: Formula, eq_2: Formula):
-        super().__init__()
-        self.sub_formulae = [eq_1, eq_2]
-        self.applicable_tableaux_rule = None
-        self.str = f"{self.sub_formulae[0]!s} \u21D4 {self.sub_formulae[1]!s}"
+    __slots__ = ()
+
+    def __new__(cls, eq_1: Formula, eq_2: Formula):
+        return super().__new__(cls, eq_1, eq_2)
 
-    def normal_form(self):  # A <-> B = A -> B /\ B -> A   see above
-        return And(Not(And(self.sub_formulae[0], Not(self.sub_formulae[1]))),
-                   Not(And(self.sub_formulae[1], Not(self.sub_formulae[0])))).normal_form()
+    def _normalize(self, eq_1: Formula, eq_2: Formula):  # A <-> B = A -> B /\ B -> A   see above
+        return And(Not(And(eq_1, _negated(eq_2))), Not(And(eq_2, _negated(eq_1))))
 
-    # def __str__(self):
-    #     return f"{self.sub_formulae[0]!s} \u21D4 {self.sub_formulae[1]!s}"
+    _template = ("( ", 0, " \u21D4 ", 1, " )")
 
 
 class Diamond(Formula):
-    def __init__(self, diamonded: Formula):
-        super().__init__()
-        self.sub_formulae = [diamonded]
-        self.applicable_tableaux_rule = None
-        self.str = f"\u25C7 {self.sub_formulae[0]!s}"
+    __slots__ = ()
+
+    def __new__(cls, diamonded: Formula):
+        return super().__new__(cls, diamonded)
+
+    _modal = 1
 
-    def normal_form(self):  # <> A = ~[]~A
-        return Not(Box(Not(self.sub_formulae[0]))).normal_form()
+    def _normalize(self, diamonded: Formula):  # <> A = ~[]~A
+        return Not(Box(_negated(diamonded)))
 
-    # def __str__(self):
-    #     return f"\u25C7 {self.sub_formulae[0]!s}"
+    _template = ("\u25C7 ", 0)
 
 
 class Top(Formula):
-    def __str__(self):
-        return "⊤"
+    __slots__ = ()
+
+    def __new__(cls):
+        return super().__new__(cls)
+
+    _template = ("⊤",)
 
 
 class Bot(Formula):
+    __slots__ = ()
 
-    def normal_form(self):  # <> A = ~[]~A
-        return Not(Top())
+    def __new__(cls):
+        return super().__new__(cls)
 
-    def __str__(self):
-        return "⊥"
+    def _normalize(self):
+        return BOT
+
+    _template = ("⊥",)
+
+
+TOP = Top()
+BOT = Not(TOP)  # the normal form of Bot()
+
+
+# lets go of all formulae built so far (but TOP and BOT), so they are freed once nobody else uses them. Only between
+# labels that share nothing: a formula built afterwards is a new node, and not equal to the same formula from before
+def forget_formulae():
+    Formula._forget((TOP, BOT))
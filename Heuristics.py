@@ -0,0 +1,158 @@
+from Formula import *
+
+"""
+Which branch the tableau tries first. There are two choices to make:
+- (¬∧): which ¬(φ ∧ ψ) of the label to split next. Its branches are then tried in order, ¬φ first
+- (¬□): in which order to try the successors. All of them have to be successful, so the one most likely to clash
+  should go first
+A Heuristic makes both. The engines also tell it about every clash (with one of the clashing formulae) and about
+every (¬□) successor they decided, so heuristics can learn from the search so far. A heuristic lives as long as one
+decide(), i.e. it starts from scratch for every label.
+
+The heuristics:
+- size: the smallest formula first, for both choices. This is the default, and what the engines do without one
+- first: whatever comes first in the label. Labels are sets, so this is some order that has nothing to do with the
+  formulae. It is what the engines used to do, back when every formula had size 1
+- depth: the lowest modal depth first, then the smallest. Shallow formulae and successors are the quick ones
+- moms: maximum occurrences. Every ¬(φ ∧ ψ) is a binary clause ¬φ ∨ ¬ψ, so all of them are of minimum size. Splits
+  the one with the sub-formula that occurs most often among all of them, preferring those that occur both as φ and as
+  ¬φ (then one of the branches is bound to clash with some other clause, or satisfy it)
+- history: (¬□) successors in the order of how often the successors of the same ¬□φ were unsatisfiable before.
+  (¬∧) as size
+- activity: every clash bumps the atoms of the clashing formula, and the bumps grow over time, so recent clashes
+  weigh more (VSIDS, as in SAT solvers). Splits the ¬(φ ∧ ψ) with the most active atom. (¬□) as history
+
+The bits engine ignores the heuristic: it always splits the first ¬(φ ∧ ψ) of the closure. The dpll engine picks its
+own literals (see Dpll.py), and only asks the heuristic for the order of the (¬□) successors.
+"""
+
+
+# φ for ¬φ, everything else as it is
+def _unnegated(formula: Formula) -> Formula:
+    return formula.sub_formulae[0] if isinstance(formula, Not) else formula
+
+
+class Heuristic:
+    name = "size"
+
+    # the ¬(φ ∧ ψ) to split next, one of the candidates. There is at least one
+    def or_branch(self, candidates: list[Formula]) -> Formula:
+        return min(candidates, key=lambda f: f.size)
+
+    # the ¬□φ in the order their successors should be tried
+    def and_order(self, witnesses: list[Formula]) -> list[Formula]:
+        return sorted(witnesses, key=lambda f: f.size)
+
+    # the formula clashed with its negation
+    def clash(self, formula: Formula):
+        pass
+
+    # the successor of the ¬□φ turned out to be satisfiable, or not
+    def successor(self, witness: Formula, satisfiable: bool):
+        pass
+
+
+class First(Heuristic):
+    name = "first"
+
+    def or_branch(self, candidates: list[Formula]) -> Formula:
+        return candidates[0]
+
+    def and_order(self, witnesses: list[Formula]) -> list[Formula]:
+        return witnesses
+
+
+class Depth(Heuristic):
+    name = "depth"
+
+    def or_branch(self, candidates: list[Formula]) -> Formula:
+        return min(candidates, key=lambda f: (f.modal_depth, f.size))
+
+    def and_order(self, witnesses: list[Formula]) -> list[Formula]:
+        return sorted(witnesses, key=lambda f: (f.modal_depth, f.size))
+
+
+class Moms(Heuristic):
+    name = "moms"
+
+    def or_branch(self, candidates: list[Formula]) -> Formula:
+        positive: dict[Formula, int] = {}
+        negative: dict[Formula, int] = {}
+        for candidate in candidates:
+            for conjunct in candidate.sub_formulae[0].sub_formulae:
+                occurrences = negative if isinstance(conjunct, Not) else positive
+                conjunct = _unnegated(conjunct)
+                occurrences[conjunct] = occurrences.get(conjunct, 0) + 1
+
+        def score(conjunct: Formula) -> tuple[int, int]:
+            conjunct = _unnegated(conjunct)
+            p, n = positive.get(conjunct, 0), negative.get(conjunct, 0)
+            return p + n, p * n
+
+        return max(candidates, key=lambda f: (max(score(conjunct) for conjunct in f.sub_formulae[0].sub_formulae),
+                                              -f.size))
+
+
+class History(Heuristic):
+    name = "history"
+
+    def __init__(self):
+        self.tried: dict[Formula, int] = {}
+        self.failed: dict[Formula, int] = {}
+
+    # the ones that failed most often first. One that was never tried counts as failing half the time
+    def and_order(self, witnesses: list[Formula]) -> list[Formula]:
+        return sorted(witnesses, key=lambda f: (-(self.failed.get(f, 0) + 1) / (self.tried.get(f, 0) + 2), f.size))
+
+    def successor(self, witness: Formula, satisfiable: bool):
+        self.tried[witness] = self.tried.get(witness, 0) + 1
+        if not satisfiable:
+            self.failed[witness] = self.failed.get(witness, 0) + 1
+
+
+class Activity(History):
+    name = "activity"
+    DECAY = 0.95  # every clash makes all earlier bumps worth this much relative to the next one
+
+    def __init__(self):
+        super().__init__()
+        self.activity: dict[Formula, float] = {}  # atom -> its score
+        self.bump = 1.0
+        self.atoms: dict[Formula, frozenset[Formula]] = {}  # formula -> the atoms in it, remembered
+
+    def atoms_of(self, root: Formula) -> frozenset[Formula]:
+        stack = [root]
+        while stack:  # post-order, every shared sub-formula only once
+            formula = stack[-1]
+            if formula in self.atoms:
+                stack.pop()
+                continue
+            missing = [sub_formula for sub_formula in formula.sub_formulae if sub_formula not in self.atoms]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            if isinstance(formula, Atom):
+                self.atoms[formula] = frozenset((formula,))
+            else:
+                self.atoms[formula] = frozenset().union(*[self.atoms[sub_formula]
+                                                          for sub_formula in formula.sub_formulae])
+        return self.atoms[root]
+
+    def or_branch(self, candidates: list[Formula]) -> Formula:
+        return max(candidates, key=lambda f: (max((self.activity.get(atom, 0.0) for atom in self.atoms_of(f)),
+                                                  default=0.0), -f.size))
+
+    def clash(self, formula: Formula):
+        for atom in self.atoms_of(formula):
+            self.activity[atom] = self.activity.get(atom, 0.0) + self.bump
+        self.bump /= Activity.DECAY
+        if self.bump > 1e100:  # scale everything down before the floats overflow. Only the order matters
+            for atom in self.activity:
+                self.activity[atom] *= 1e-100
+            self.bump *= 1e-100
+
+
+# name -> class. Every decide() gets a new one
+HEURISTICS: dict[str, type[Heuristic]] = {heuristic.name: heuristic
+                                          for heuristic in (Heuristic, First, Depth, Moms, History, Activity)}
@@ -0,0 +1,259 @@
+import random
+import time
+from Formula import *
+
+try:
+    import numpy
+except ImportError:  # not required, candidates are then checked with bitmasks
+    numpy = None
+
+"""
+An incomplete pass before the tableau: look for a small Kripke model of the label directly. Many labels are easily
+satisfiable, and a model of a few worlds can be found faster than the tableau expands every (¬□) successor. On the
+LWB k_ph_n formulae it finds models the recursive tableau does not get to within seconds. On small labels the tableau
+is usually quicker though (and dpll is quick on k_ph_n as well), and for unsatisfiable ones the search is wasted. So
+it is only done when asked for.
+
+A candidate model has worlds 0 ... n-1, a valuation (which atoms are true in which worlds) and an accessibility
+relation, any relation, not only trees. World 0 is where the label has to hold. Candidates are checked by evaluating
+every sub-formula of the label in all worlds at once, children before parents:
+- with numpy, a whole batch of candidates at once: every sub-formula is a (candidates x worlds) boolean matrix, and
+  □φ holds in the worlds none of whose successors (rows of the adjacency matrices) is outside of φ
+- without it, one candidate at a time, every sub-formula a bitmask over the worlds
+Both give the same answers, numpy is just faster on larger batches.
+
+The search is a local search (in the style of WalkSAT), for n = 1 ... max_worlds worlds, or just one world if the
+label has no □ at all. It starts from a random candidate. Then, as long as some formula of the label does not hold in
+world 0, it picks one of those, and moves to the best of a random sample of the neighbours that can change it: one of
+its atoms flipped in one world, or one edge added or removed. Best means with the most formulae of the label in world
+0. Without numpy, the first neighbour that is better than the current candidate is taken right away, the rest of the
+sample is not checked. After flips moves without a model it starts over, tries times per n. It only ever says
+"satisfiable", with the model to prove it. Finding none says nothing, the label then goes to the tableau as usual.
+
+The finder counts how often it was asked, how often it found a model, and the time it took. The last model it found
+is kept as finder.model, for inspection.
+"""
+
+ATOM, TOP, NOT, AND, BOX = range(5)
+
+
+# the distinct sub-formulae of the label, children before parents, as (kind, first, second) with the positions of the
+# children, or the atom's number. Also returns the positions of the label's formulae, and the atoms by number
+def compiled(label: set[Formula]) -> tuple[list[tuple[int, int, int]], list[int], list[str]]:
+    positions: dict[Formula, int] = {}
+    nodes: list[tuple[int, int, int]] = []
+    atoms: dict[str, int] = {}
+    for formula in label:
+        stack = [formula]
+        while stack:  # post-order
+            node = stack[-1]
+            if node in positions:
+                stack.pop()
+                continue
+            missing = [sub_formula for sub_formula in node.sub_formulae if sub_formula not in positions]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            children = [positions[sub_formula] for sub_formula in node.sub_formulae] + [0, 0]
+            if isinstance(node, Atom):
+                nodes.append((ATOM, atoms.setdefault(node.name, len(atoms)), 0))
+            elif isinstance(node, Top):
+                nodes.append((TOP, 0, 0))
+            elif isinstance(node, Not):
+                nodes.append((NOT, children[0], 0))
+            elif isinstance(node, And):
+                nodes.append((AND, children[0], children[1]))
+            elif isinstance(node, Box):
+                nodes.append((BOX, children[0], 0))
+            else:
+                raise ValueError(f"{node.__class__.__name__} is not in normal form")
+            positions[node] = len(nodes) - 1
+    return nodes, [positions[formula] for formula in label], list(atoms)
+
+
+# a candidate: for every atom the worlds it is true in, for every world its successors. Both as bitmasks over worlds
+Candidate = tuple[tuple[int, ...], tuple[int, ...]]
+
+
+# every sub-formula's worlds as a bitmask, for one candidate
+def extensions(nodes: list[tuple[int, int, int]], candidate: Candidate, worlds: int) -> list[int]:
+    valuation, successors = candidate
+    everywhere = (1 << worlds) - 1
+    extension = []
+    append = extension.append
+    for kind, first, second in nodes:
+        if kind == ATOM:
+            append(valuation[first])
+        elif kind == TOP:
+            append(everywhere)
+        elif kind == NOT:
+            append(everywhere & ~extension[first])
+        elif kind == AND:
+            append(extension[first] & extension[second])
+        else:  # BOX: the worlds without a successor outside of the boxed formula
+            outside = everywhere & ~extension[first]
+            boxed = 0
+            for world in range(worlds):
+                if not successors[world] & outside:
+                    boxed |= 1 << world
+            append(boxed)
+    return extension
+
+
+# for every candidate, how many of the label's formulae hold in world 0
+def scores_bits(nodes: list[tuple[int, int, int]], roots: list[int], candidates: list[Candidate],
+                worlds: int) -> list[int]:
+    scores = []
+    for candidate in candidates:
+        extension = extensions(nodes, candidate, worlds)
+        scores.append(sum(extension[root] & 1 for root in roots))
+    return scores
+
+
+# the same for a whole batch at once, with numpy
+def scores_numpy(nodes: list[tuple[int, int, int]], roots: list[int], candidates: list[Candidate],
+                 worlds: int) -> list[int]:
+    bits = numpy.arange(worlds)
+    # (candidates x atoms x worlds) and (candidates x worlds x successors)
+    valuation = (numpy.array([candidate[0] for candidate in candidates], dtype=numpy.int64)[:, :, None] >> bits) & 1
+    valuation = valuation.astype(bool)
+    adjacency = (numpy.array([candidate[1] for candidate in candidates], dtype=numpy.int64)[:, :, None] >> bits) & 1
+    adjacency = adjacency.astype(bool)
+    everywhere = numpy.ones((len(candidates), worlds), dtype=bool)
+    extension = []
+    for kind, first, second in nodes:
+        if kind == ATOM:
+            extension.append(valuation[:, first, :])
+        elif kind == TOP:
+            extension.append(everywhere)
+        elif kind == NOT:
+            extension.append(~extension[first])
+        elif kind == AND:
+            extension.append(extension[first] & extension[second])
+        else:
+            extension.append(~numpy.any(adjacency & ~extension[first][:, None, :], axis=2))
+    return sum(extension[root][:, 0].astype(int) for root in roots).tolist()
+
+
+class Model:
+    def __init__(self, atoms: list[str], candidate: Candidate, worlds: int):
+        self.worlds = worlds
+        valuation, successors = candidate
+        # the successors of every world, and the atoms true in it
+        self.successors = [[v for v in range(worlds) if successors[w] >> v & 1] for w in range(worlds)]
+        self.valuation = {atom: {w for w in range(worlds) if valuation[i] >> w & 1} for i, atom in enumerate(atoms)}
+
+    # whether the formula (in normal form) holds in the world. For checking a model, e.g. against the finder itself
+    def satisfies(self, formula: Formula, world: int = 0) -> bool:
+        nodes, roots, atoms = compiled({formula})
+        candidate = (tuple(sum(1 << w for w in self.valuation.get(atom, ())) for atom in atoms),
+                     tuple(sum(1 << v for v in self.successors[w]) for w in range(self.worlds)))
+        return bool(extensions(nodes, candidate, self.worlds)[roots[0]] >> world & 1)
+
+    def __str__(self):
+        lines = []
+        for world in range(self.worlds):
+            atoms = ", ".join(sorted(atom for atom, worlds in self.valuation.items() if world in worlds))
+            successors = ", ".join(f"w{successor}" for successor in self.successors[world])
+            lines.append(f"w{world}: {{{atoms}}} -> {{{successors}}}")
+        return "\n".join(lines)
+
+
+class ModelFinder:
+    def __init__(self, max_worlds: int = 3, tries: int = 3, flips: int = 30, neighbours: int = 32, seed: int = 0,
+                 vectorized: bool | None = None):
+        self.max_worlds = max_worlds
+        self.tries = tries  # restarts per number of worlds
+        self.flips = flips  # moves per try
+        self.neighbours = neighbours  # sampled per move
+        self.random = random.Random(seed)
+        # numpy if it is there, unless told otherwise
+        self.vectorized = numpy is not None if vectorized is None else vectorized and numpy is not None
+        self.model: Model | None = None  # the last one found
+        self.searches = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    # a model of the (normalized) label, or None if none was found
+    def find(self, label: set[Formula]) -> Model | None:
+        start = time.perf_counter()
+        self.searches += 1
+        model = None
+        if label:
+            nodes, roots, atoms = compiled(label)
+            # the atoms in every sub-formula, as a bitmask over their numbers
+            contained = []
+            for kind, first, second in nodes:
+                if kind == ATOM:
+                    contained.append(1 << first)
+                elif kind == AND:
+                    contained.append(contained[first] | contained[second])
+                elif kind == TOP:
+                    contained.append(0)
+                else:
+                    contained.append(contained[first])
+            # without a □ one world is as good as any number of them
+            max_worlds = self.max_worlds if any(kind == BOX for kind, _, _ in nodes) else 1
+            for worlds in range(1, max_worlds + 1):
+                model = self.__search(nodes, roots, atoms, [contained[root] for root in roots], worlds)
+                if model is not None:
+                    break
+        else:  # nothing has to hold, any world will do
+            model = Model([], ((), (0,)), 1)
+        if model is not None:
+            self.hits += 1
+            self.model = model
+        self.seconds += time.perf_counter() - start
+        return model
+
+    def __search(self, nodes: list[tuple[int, int, int]], roots: list[int], atoms: list[str], contained: list[int],
+                 worlds: int) -> Model | None:
+        score = scores_numpy if self.vectorized else scores_bits
+        # a move flips one atom in one world, or one edge. Those that can change a formula of the label: the atoms in
+        # it, and all edges
+        edges = [(1, world, successor) for world in range(worlds) for successor in range(worlds)]
+        focus = [[(0, atom, world) for atom in range(len(atoms)) if mask >> atom & 1 for world in range(worlds)] + edges
+                 for mask in contained]
+        for _ in range(self.tries):
+            candidate = (tuple(self.random.getrandbits(worlds) for _ in atoms),
+                         tuple(self.random.getrandbits(worlds) for _ in range(worlds)))
+            for flip in range(self.flips + 1):
+                extension = extensions(nodes, candidate, worlds)
+                unsatisfied = [i for i, root in enumerate(roots) if not extension[root] & 1]
+                if not unsatisfied:
+                    return Model(atoms, candidate, worlds)
+                if flip == self.flips:
+                    break
+                best = len(roots) - len(unsatisfied)
+                moves = focus[self.random.choice(unsatisfied)]
+                sample = self.random.sample(moves, min(self.neighbours, len(moves)))
+                if self.vectorized:  # the whole sample in one batch
+                    neighbours = [self.__flipped(candidate, move) for move in sample]
+                    scores = score(nodes, roots, neighbours, worlds)
+                else:  # one at a time, up to the first that is better than what we have
+                    neighbours, scores = [], []
+                    for move in sample:
+                        neighbours.append(self.__flipped(candidate, move))
+                        scores.append(score(nodes, roots, neighbours[-1:], worlds)[0])
+                        if scores[-1] > best:
+                            break
+                top = max(scores)
+                # the best neighbour, even if it is worse than the current candidate. That gets out of local maxima
+                candidate = self.random.choice([n for n, s in zip(neighbours, scores) if s == top])
+        return None
+
+    @staticmethod
+    def __flipped(candidate: Candidate, move: tuple[int, int, int]) -> Candidate:
+        part, i, world = move
+        flipped = list(candidate[part])
+        flipped[i] ^= 1 << world
+        return (tuple(flipped), candidate[1]) if part == 0 else (candidate[0], tuple(flipped))
+
+    def counters(self) -> dict:
+        return {"searches": self.searches, "hits": self.hits,
+                "hit_rate": self.hits / self.searches if self.searches else None, "seconds": self.seconds,
+                "numpy": self.vectorized}
+
+    def __str__(self):
+        return ", ".join(f"{name}: {value}" for name, value in self.counters().items())
@@ -0,0 +1,258 @@
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from Formula import *
+from Formula import _negated
+from Cache import SatCache
+from Stats import Stats
+import Reasoner
+from Heuristics import HEURISTICS
+from Store import ResultStore
+from Budget import Budget, BudgetExceeded
+from ModelFinder import ModelFinder
+
+"""
+Spreading the work over several processes, on two levels:
+- the labels of a file are independent, so several of them are solved at once
+- a large label is split into independent sub-problems: the two (¬∧) branches (one of them has to be successful)
+  and the (¬□) successors (all of them have to be). The parent process expands the top of the tableau until there are
+  enough sub-problems to keep the workers busy, and hands those to the pool.
+As soon as an Or-branch is successful, or an And-successor is not, the other side is no longer needed. Sub-problems
+that did not start yet are cancelled. Running ones cannot be interrupted, their result is just ignored.
+
+Every worker process has its own engine and (optionally) its own SatCache, which lives as long as the pool. Every
+sub-problem gets a new heuristic. The top of the tableau always branches on the smallest formula first.
+With statistics, every sub-problem is counted in a Stats of its own, which is sent back with the answer and merged.
+The top of the tableau, that the parent expands itself, is not counted.
+"""
+
+# labels with at least this many distinct sub-formulae are split up, smaller ones are solved by a single worker
+SPLIT_THRESHOLD = 200
+
+__engine = "recursive"
+__cache: SatCache | None = None
+__stats = False
+__heuristic = "size"
+__limits: tuple[float | None, int | None, int | None] | None = None  # seconds, nodes, bytes of a Budget per label
+__finder: ModelFinder | None = None
+
+
+def __init_worker(engine: str, cache_size: int, stats: bool, heuristic: str,
+                  limits: tuple[float | None, int | None, int | None] | None, model_worlds: int | None):
+    global __engine, __cache, __stats, __heuristic, __limits, __finder
+    __engine = engine
+    __cache = SatCache(cache_size) if cache_size > 0 else None
+    __stats = stats
+    __heuristic = heuristic
+    __limits = limits
+    __finder = ModelFinder(model_worlds) if model_worlds is not None else None
+
+
+# runs in the workers. The label is normalized already. Returns the answer (None if it ran out of budget), the time it
+# took, maybe its Stats, and with limits its Budget, i.e. how many nodes it took and which limit it reached, if any
+def __solve(label: set[Formula]) -> tuple[bool | None, float, Stats | None, Budget | None]:
+    start = time.perf_counter()
+    stats = Stats() if __stats else None
+    budget = None if __limits is None else Budget(*__limits)
+    phase = "solve"
+    try:
+        if __finder is not None and __finder.find(label) is not None:
+            satisfiable = True
+            phase = "model search"  # a search that found nothing counts as solving
+        else:
+            satisfiable = Reasoner.ENGINES[__engine](label, __cache, stats, HEURISTICS[__heuristic](), budget)
+    except BudgetExceeded:
+        satisfiable = None
+    seconds = time.perf_counter() - start
+    if stats is not None:
+        stats.time(phase, seconds)
+    return satisfiable, seconds, stats, budget
+
+
+def make_pool(jobs: int, engine: str = "recursive", cache_size: int = 0, stats: bool = False,
+              heuristic: str = "size", limits: tuple[float | None, int | None, int | None] | None = None,
+              model_worlds: int | None = None) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(jobs, initializer=__init_worker,
+                               initargs=(engine, cache_size, stats, heuristic, limits, model_worlds))
+
+
+# one step of Reasoner.successful: all non-branching rules, the clash check and one branching rule.
+# Returns the answer, if the label is decided by that, otherwise "or"/"and" with the labels of the branches. Those are
+# normal forms again (no ¬¬), as the engines expect
+def expand(label: set[Formula]) -> bool | tuple[str, list[set[Formula]]]:
+    label = set(label)
+    quick_rules = [formula for formula in label if formula.applicable_tableaux_rule in ("NotNot", "And")]
+    while quick_rules:
+        formula = quick_rules.pop()
+        if formula not in label:
+            continue
+        label.remove(formula)
+        if formula.applicable_tableaux_rule == "NotNot":
+            new_formulae = formula.sub_formulae[0].sub_formulae
+        else:
+            new_formulae = formula.sub_formulae
+        for new_formula in new_formulae:
+            if new_formula not in label:
+                label.add(new_formula)
+                if new_formula.applicable_tableaux_rule in ("NotNot", "And"):
+                    quick_rules.append(new_formula)
+
+    for formula in label:
+        if isinstance(formula, Not) and (formula.sub_formulae[0] in label or isinstance(formula.sub_formulae[0], Top)):
+            return False
+
+    or_branches = [formula for formula in label if formula.applicable_tableaux_rule == "NotAnd"]
+    if or_branches:
+        branch_formula = min(or_branches, key=lambda f: f.size)
+        label.remove(branch_formula)
+        conjuncts = branch_formula.sub_formulae[0].sub_formulae
+        return "or", [label | {_negated(conjuncts[0])}, label | {_negated(conjuncts[1])}]
+
+    and_branches = [formula for formula in label if formula.applicable_tableaux_rule == "NotBox"]
+    if not and_branches:
+        return True
+    unboxed = {formula.sub_formulae[0] for formula in label if isinstance(formula, Box)}
+    return "and", [unboxed | {_negated(formula.sub_formulae[0].sub_formulae[0])} for formula in and_branches]
+
+
+# a node of the top of the tableau, that the parent process expands itself
+class _Node:
+    __slots__ = ("label", "parent", "kind", "children", "value", "future")
+
+    def __init__(self, label: set[Formula], parent: "_Node | None"):
+        self.label = label
+        self.parent = parent
+        self.kind: str | None = None  # "or" / "and" once expanded
+        self.children: list[_Node] = []
+        self.value: bool | None = None
+        self.future: Future | None = None
+
+    # once a node is decided, nothing below it is needed any more
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+        for child in self.children:
+            child.cancel()
+
+
+# set the value of a node, and pass it on to its ancestors as far as it decides them
+def __decide(node: _Node, value: bool):
+    while node is not None and node.value is None:
+        node.value = value
+        node.cancel()
+        parent = node.parent
+        if parent is None:
+            return
+        undecided = any(child.value is None for child in parent.children)
+        if parent.kind == "or" and not value and undecided:
+            return  # some other branch may still be successful
+        if parent.kind == "and" and value and undecided:
+            return  # some other successor may still fail
+        node = parent
+
+
+# decide a single (normalized) label, splitting it into sub-problems for the pool
+def parallel_successful(label: set[Formula], pool: ProcessPoolExecutor, jobs: int,
+                        threshold: int = SPLIT_THRESHOLD, stats: Stats | None = None) -> bool:
+    root = _Node(label, None)
+    leaves = deque([root])
+    # expand the largest leaves in the parent until there is enough to do for all workers
+    while leaves and len(leaves) < 2 * jobs and root.value is None:
+        node = max(leaves, key=lambda n: closure_size(n.label))
+        if closure_size(node.label) < threshold:
+            break
+        leaves.remove(node)
+        if __has_decided_ancestor(node):
+            continue
+        step = expand(node.label)
+        if isinstance(step, bool):
+            __decide(node, step)
+            continue
+        node.kind, branches = step
+        node.children = [_Node(branch, node) for branch in branches]
+        leaves.extend(node.children)
+    if root.value is not None:
+        return root.value
+
+    running: dict[Future, _Node] = {}
+    for node in leaves:
+        if not __has_decided_ancestor(node):
+            node.future = pool.submit(__solve, node.label)
+            running[node.future] = node
+    while root.value is None:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            node = running.pop(future)
+            if future.cancelled():
+                continue
+            satisfiable, _, worker_stats, _ = future.result()
+            if stats is not None and worker_stats is not None:
+                stats.merge(worker_stats)
+            if not __has_decided_ancestor(node):
+                __decide(node, satisfiable)
+    root.cancel()
+    return root.value
+
+
+def __has_decided_ancestor(node: _Node | None) -> bool:
+    while node is not None:
+        if node.value is not None:
+            return True
+        node = node.parent
+    return False
+
+
+# decide many labels with a pool of jobs processes. Takes (index, label) pairs, and yields (index, label, answer, time)
+# in the same order, as soon as they are known. Small labels go to the pool as a whole, large ones are split up with
+# parallel_successful. Only a few labels per worker are read ahead, so labels can be a lazy iterator of any length
+# with stats, the counters of all workers are merged into it
+# with a store, the parent looks every label up there first, and puts the answers of the workers there
+# with limits (seconds, nodes, bytes), every label gets a Budget of that size in its worker, and labels are not split:
+# the sub-problems of a label would each have a budget of their own. The answer may then be None (unknown). total is a
+# budget for the whole batch. Only its time is checked, by the parent before it hands out a label
+# with budgets, the Budget of every label is put there under its index, as its worker counted it (or total, for the
+# labels it left no time for). That is where to look up why an answer is unknown
+# with model_worlds, the workers look for a model of up to that many worlds first (see ModelFinder.py), for every label
+# and every sub-problem of a split one
+def decide_all(labels, engine: str = "recursive", jobs: int = 2, cache_size: int = 0,
+               threshold: int = SPLIT_THRESHOLD, stats: Stats | None = None, heuristic: str = "size",
+               store: ResultStore | None = None, limits: tuple[float | None, int | None, int | None] | None = None,
+               total: Budget | None = None, model_worlds: int | None = None, budgets: dict[int, Budget] | None = None):
+    if limits is not None:
+        threshold = float("inf")
+    with make_pool(jobs, engine, cache_size, stats is not None, heuristic, limits, model_worlds) as pool:
+        # (index, label, key in the store or None, answer)
+        answers: deque[tuple[int, set[Formula], str | None,
+                             Future | tuple[bool | None, float, Stats | None, Budget | None]]] = deque()
+        for index, label in labels:
+            start = time.perf_counter()
+            normal = Reasoner.normalized(label)
+            key = store.key(normal) if store is not None else None
+            known = store.get(key) if store is not None else None
+            if known is not None:
+                answers.append((index, label, None, (known, time.perf_counter() - start, None, None)))
+            elif total is not None and not total.left():
+                answers.append((index, label, None, (None, time.perf_counter() - start, None, total)))
+            elif closure_size(normal) >= threshold:
+                satisfiable = parallel_successful(normal, pool, jobs, threshold, stats)
+                answers.append((index, label, key, (satisfiable, time.perf_counter() - start, None, None)))
+            else:
+                answers.append((index, label, key, pool.submit(__solve, normal)))
+            while answers and (len(answers) > 4 * jobs or not isinstance(answers[0][3], Future)
+                               or answers[0][3].done()):
+                yield __result(*answers.popleft(), stats, store, engine, budgets)
+        for answer in answers:
+            yield __result(*answer, stats, store, engine, budgets)
+
+
+def __result(index: int, label: set[Formula], key: str | None,
+             answer: Future | tuple[bool | None, float, Stats | None, Budget | None], stats: Stats | None,
+             store: ResultStore | None, engine: str, budgets: dict[int, Budget] | None):
+    satisfiable, seconds, worker_stats, budget = answer.result() if isinstance(answer, Future) else answer
+    if stats is not None and worker_stats is not None:
+        stats.merge(worker_stats)
+    if budgets is not None and budget is not None:
+        budgets[index] = budget
+    if key is not None and satisfiable is not None:
+        store.put(key, satisfiable, seconds, engine)
+    return index, label, satisfiable, seconds
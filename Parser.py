@@ -1,4 +1,6 @@
 import logging
+import re
+from collections.abc import Callable, Iterable, Iterator
 from Formula import *
 
 
@@ -58,7 +60,7 @@ def __shunt(formula: str) -> str:
             case "\u21D4" | "<->":  # BiImplication
                 while len(stack) != 0 and __precedence(stack[-1]) >= 40:
                     rpn.append(stack.pop())
-                stack.append("\u2228")
+                stack.append("\u21D4")
             case "\u25C7" | '♢' | "<>":  # Diamond
                 stack.append("\u25C7")  # highest precedence
             case "(":
@@ -116,10 +118,93 @@ def __parse_rpn_formula(rpn: str) -> Formula:
     return f_stack.pop()
 
 
-def parse_formula_str(formula: str) -> Formula:
+# the old way: shunting-yard to a RPN string, then parsing that. Needs spaces between all symbols.
+# Only kept as a baseline for the parser benchmark in Test.py
+def parse_formula_str_two_pass(formula: str) -> Formula:
     return __parse_rpn_formula(__shunt(formula))
 
 
+# every spelling of a symbol the tokenizer knows, mapped to the unicode one. ASCII operators may have several characters
+__SYMBOLS = {"\u00AC": "\u00AC", "~": "\u00AC",  # Not
+             "\u2227": "\u2227", "/\\": "\u2227",  # And
+             "\u2228": "\u2228", "\\/": "\u2228",  # Or
+             "\u25FB": "\u25FB", "□": "\u25FB", "[]": "\u25FB",  # Box
+             "\u2192": "\u2192", "->": "\u2192",  # Implication
+             "\u21D4": "\u21D4", "↔": "\u21D4", "<->": "\u21D4",  # BiImplication
+             "\u25C7": "\u25C7", "♢": "\u25C7", "<>": "\u25C7",  # Diamond
+             "⊤": "⊤", "⊥": "⊥", "(": "(", ")": ")"}
+# longest spellings first, so "<->" is not read as "<" and "->". Atoms are runs of anything that is no symbol,
+# and whatever is left is a single unknown character
+__TOKEN = re.compile(r"(" + "|".join(re.escape(s) for s in sorted(__SYMBOLS, key=len, reverse=True)) + r")"
+                     + r"|([^\s,(){}" + re.escape("".join(c for s in __SYMBOLS for c in s)) + r"]+)|(\S)")
+__UNARY = {"\u00AC": Not, "\u25FB": Box, "\u25C7": Diamond}
+__BINARY = {"\u2227": And, "\u2228": Or, "\u2192": Implication, "\u21D4": BiImplication}
+__PRECEDENCE = {operator: __precedence(operator) for operator in ["(", *__UNARY, *__BINARY]}
+
+
+# pop the operator's operands, and push the Formula it makes of them
+def __reduce(operator: str, operands: list[Formula]):
+    try:
+        if operator in __UNARY:
+            operands.append(__UNARY[operator](operands.pop()))
+        else:
+            right = operands.pop()
+            operands.append(__BINARY[operator](operands.pop(), right))
+    except IndexError:
+        raise ValueError(f"{operator} is missing an operand") from None
+
+
+# tokenizing and shunting-yard in one go. Instead of writing RPN, every operator directly becomes a Formula, as soon as
+# the shunting-yard algorithm would output it. Spaces between the symbols are optional
+def parse_formula_str(formula: str) -> Formula:
+    operands: list[Formula] = []
+    operators: list[str] = []  # the shunting-yard stack
+    for symbol, atom, unknown in __TOKEN.findall(formula):
+        if symbol:
+            token = __SYMBOLS[symbol]
+        elif atom == "n" or atom == "v":  # the old ASCII imitations for And and Or, as long as they stand alone
+            token = "\u2227" if atom == "n" else "\u2228"
+        elif atom:
+            operands.append(Atom(atom))
+            continue
+        else:
+            logging.warning(f"Unknown symbol {unknown!r} in {formula!r}. Will ignore it.")
+            continue
+
+        if token in __BINARY:
+            precedence = __PRECEDENCE[token]
+            if token == "\u2192":  # Implication is right-associative, so it does not pop other implications
+                precedence += 1
+            while operators and __PRECEDENCE[operators[-1]] >= precedence:
+                __reduce(operators.pop(), operands)
+            operators.append(token)
+        elif token in __UNARY or token == "(":  # unary operators bind strongest, nothing to pop for them
+            operators.append(token)
+        elif token == ")":
+            while operators and operators[-1] != "(":
+                __reduce(operators.pop(), operands)
+            if operators:
+                operators.pop()  # lastly remove "(" from the stack
+            else:
+                logging.warning("Too many closing brackets. Will ignore this one.")
+        elif token == "⊤":
+            operands.append(Top())
+        else:  # ⊥
+            operands.append(Bot())
+
+    while operators:
+        operator = operators.pop()
+        if operator == "(":
+            logging.warning("A opening bracket never got closed. Closing implicitly at end of Formula")
+        else:
+            __reduce(operator, operands)
+    if not operands:
+        raise ValueError(f"No formula in {formula!r}")
+    if len(operands) > 1:
+        logging.error("Input contained a not closed formula")
+    return operands.pop()
+
+
 def parse_label_str(source: str) -> set[Formula]:
     if source.startswith("{"):  # if there are set-brackets around the label, remove them
         source = source[1:-1]
@@ -127,10 +212,33 @@ def parse_label_str(source: str) -> set[Formula]:
     return {parse_formula_str(formula) for formula in formulae}
 
 
-def parse_file(file_adr: str) -> list[set[Formula]]:
+# parses the labels one line at a time, as they are read. Yields (line number, label), blank lines are skipped.
+# Nothing but the current line is kept in memory, so this works for files of any size
+# with errors, a line that cannot be parsed is handed to it as (line number, message) and skipped, and the lines after
+# it are parsed as usual. Without, its ValueError ends the iteration
+def iter_lines(lines: Iterable[str],
+               errors: Callable[[int, str], None] | None = None) -> Iterator[tuple[int, set[Formula]]]:
+    for n, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            label = parse_label_str(line)
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors(n, str(e))
+            continue
+        yield n, label
+
+
+def iter_file(file_adr: str, errors: Callable[[int, str], None] | None = None) -> Iterator[tuple[int, set[Formula]]]:
     with open(file_adr, encoding="utf-8") as f:
-        file = f.read().splitlines()
-    return [parse_label_str(label) for label in file]
+        yield from iter_lines(f, errors)
+
+
+def parse_file(file_adr: str) -> list[set[Formula]]:
+    return [label for _, label in iter_file(file_adr)]
 
 
 if __name__ == '__main__':
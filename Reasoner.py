@@ -1,7 +1,23 @@
+import argparse
+import json
 import logging
+import os
 import sys
+import time
+from collections.abc import Callable
 from Formula import *
+from Closure import successful_bits
+from Cache import SatCache
+from Stats import Stats
+import Trail
+import Dpll
+import Simplify
 import Parser
+import Corpus
+from Store import ResultStore
+from Budget import Budget, BudgetExceeded
+from Heuristics import Heuristic, HEURISTICS
+from ModelFinder import ModelFinder
 
 """
 Since formulae are objects all splitting and reducing of them is just handling of pointers into the original formula.
@@ -25,15 +41,20 @@ def normalized(label: set[Formula]) -> set:
 
 # returns whether a label is successful, i.e. the set of formulae is satisfiable
 # only call with normalized labels, otherwise it will prematurely consider it saturated
-def successful(label: set[Formula]) -> bool:
-    logging.basicConfig(level=logging.INFO, filename="reasoner.log", encoding='utf-8')
-    logging.info(f"Starting with: {show(label)}")
-
+# with a cache, the (¬□) successors are looked up before solving them and remembered afterwards
+# with stats, the rules, clashes etc. are counted there (see Stats.py). depth is only for that, leave it at 0
+# with a heuristic, it chooses the branches (see Heuristics.py). Without one the smallest formula goes first
+# with a budget, every node is spent from it, and BudgetExceeded raised once it is used up (see Budget.py)
+def successful(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+               heuristic: Heuristic | None = None, budget: Budget | None = None, depth: int = 0) -> bool:
     # check for clashes
     negated_formulae = [formula.sub_formulae[0] for formula in label if isinstance(formula, Not)]
     for formula in negated_formulae:
-        if formula in label or formula == Top():
-            logging.info(f"Clash on {formula} detected")
+        if formula in label or isinstance(formula, Top):
+            if stats is not None:
+                stats.clash(depth, formula)
+            if heuristic is not None:
+                heuristic.clash(formula)
             return False
 
     # we have to check for saturation later, so doing it here would just be boilerplate
@@ -45,6 +66,8 @@ def successful(label: set[Formula]) -> bool:
     while quick_rules:
         for formula in quick_rules:
             quick_rules.remove(formula)
+            if stats is not None:
+                stats.rule(formula.applicable_tableaux_rule, depth, formula)
             match formula.applicable_tableaux_rule:
                 case "NotNot":
                     # accessing formulas two layers deep is not pretty. But I am not sure, if it can be done much better
@@ -52,35 +75,42 @@ def successful(label: set[Formula]) -> bool:
                     label.remove(formula)
                     label.add(new_formula)
                     # this may have added a new quick rule
-                    if new_formula.applicable_tableaux_rule == "NotNot" or \
-                            new_formula.applicable_tableaux_rule == "And" and \
+                    if (new_formula.applicable_tableaux_rule == "NotNot" or
+                            new_formula.applicable_tableaux_rule == "And") and \
                             new_formula not in quick_rules:  # Label is a set. Remove no formula twice
                         quick_rules.append(new_formula)
                 case "And":
                     label.remove(formula)
                     label.update(formula.sub_formulae)   # adds both sub formulae
                     # this may have added new rules, add them
-                    if formula.sub_formulae[0].applicable_tableaux_rule == "NotNot" or \
-                            formula.sub_formulae[0].applicable_tableaux_rule == "And" and \
+                    if (formula.sub_formulae[0].applicable_tableaux_rule == "NotNot" or
+                            formula.sub_formulae[0].applicable_tableaux_rule == "And") and \
                             formula.sub_formulae[0] not in quick_rules:  # Label is a set. Remove no formula twice
                         quick_rules.append(formula.sub_formulae[0])
-                    if formula.sub_formulae[1].applicable_tableaux_rule == "NotNot" or \
-                            formula.sub_formulae[1].applicable_tableaux_rule == "And" and \
-                            formula.sub_formulae[0] not in quick_rules:  # Label is a set. Remove no formula twice
+                    if (formula.sub_formulae[1].applicable_tableaux_rule == "NotNot" or
+                            formula.sub_formulae[1].applicable_tableaux_rule == "And") and \
+                            formula.sub_formulae[1] not in quick_rules:  # Label is a set. Remove no formula twice
                         quick_rules.append(formula.sub_formulae[1])
-    logging.debug(f"After all quick rules: {show(label)}")
+    if stats is not None:
+        stats.node(depth, len(label))
+    if budget is not None:
+        budget.spend()
 
-    # We have to check for clashes again
+    # We have to check for clashes again. ¬⊤ may have been inside a conjunction, now that the parser knows ⊤
     negated_formulae = [formula.sub_formulae[0] for formula in label if isinstance(formula, Not)]
     for formula in negated_formulae:
-        if formula in label:
-            logging.info(f"Clash on {formula} detected")
+        if formula in label or isinstance(formula, Top):
+            if stats is not None:
+                stats.clash(depth, formula)
+            if heuristic is not None:
+                heuristic.clash(formula)
             return False
 
     # Check if label is saturated i.e. no rules are applicable
     possible_rules = [formula for formula in label if formula.applicable_tableaux_rule is not None]
     if not possible_rules:
-        logging.info(f"Label is saturated")
+        if stats is not None:
+            stats.open(depth)
         return True
 
     # we continue with or-branching, as we need to propositionally saturate the label
@@ -88,68 +118,360 @@ def successful(label: set[Formula]) -> bool:
     if or_branches:
         # As a crude heuristic we branch on the smallest formula first, hoping it succeeds (or clashes) quickly
         # We directly discard the top-level "Not", to avoid sub_formulae[].sub_formulae[]
-        branch_formula = min(or_branches, key=lambda f: f.size).sub_formulae[0]
-        logging.info(f"Or-Branching on {Not(branch_formula)}")
+        if heuristic is None:
+            branch_formula = min(or_branches, key=lambda f: f.size).sub_formulae[0]
+        else:
+            branch_formula = heuristic.or_branch(or_branches).sub_formulae[0]
+        if stats is not None:
+            stats.rule("NotAnd", depth, Not(branch_formula))
         label.remove(Not(branch_formula))
         # perform the (¬∧) rule
         branch_1 = label.copy()
         branch_1.add(Not(branch_formula.sub_formulae[0]))
-        logging.debug(f"Branch 1: {show(branch_1)}")
         branch_2 = label.copy()
         branch_2.add(Not(branch_formula.sub_formulae[1]))
-        logging.debug(f"Branch 2: {show(branch_2)}")
-        return successful(branch_1) or successful(branch_2)
-    logging.info(f"{show(label)} is propositionally saturated, And-Branching now")
+        return (successful(branch_1, cache, stats, heuristic, budget, depth + 1)
+                or successful(branch_2, cache, stats, heuristic, budget, depth + 1))
 
     # finally the and-branching
     # first get all Not-Box formulae
     and_branches = [formula for formula in label if formula.applicable_tableaux_rule == "NotBox"]
     if not and_branches:  #
-        logging.info(f"Label is saturated")
+        if stats is not None:
+            stats.open(depth)
         return True
     # as a crude heuristic we branch on the smallest formula first, hoping it clashes (or succeeds) quickly
-    and_branches.sort(key=lambda f: f.size)
-    logging.debug(f"All branches: {[b.__str__() for b in  and_branches]}")
+    if heuristic is None:
+        and_branches.sort(key=lambda f: f.size)
+    else:
+        and_branches = heuristic.and_order(and_branches)
     # then remove all non-boxed formulae and unbox the boxed ones
     label = {formula.sub_formulae[0] for formula in label if isinstance(formula, Box)}
-    logging.debug(f"\"Unboxed\" Label: {show(label)}")
     # now check for all branches, whether they are successful.
     # To try and save space on the heap we use a lazy generator. K being PSpace complete, this will not always work
     # I admit this is a pretty big expression, but it cannot be broken down without outsourcing it to a
     # generator function, and that will not improve the readability by much
-    branches = (successful(label.copy().union({Not(formula.sub_formulae[0].sub_formulae[0])})) for formula in
-                and_branches)
+    branches = (cached_successful(label.union({Not(formula.sub_formulae[0].sub_formulae[0])}), cache, stats,
+                                  heuristic, budget, depth + 1, formula) for formula in and_branches)
     return all(branches)
 
 
+# successful(), but asks the cache first. Without a cache this is just successful()
+# with stats, the (¬□) rule that leads to this label is counted here, so labels answered by the cache count as well
+# the same goes for telling the heuristic how the successor of the witness ¬□φ turned out
+def cached_successful(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                      heuristic: Heuristic | None = None, budget: Budget | None = None, depth: int = 0,
+                      witness: Formula | None = None) -> bool:
+    if stats is not None:
+        stats.rule("NotBox", depth - 1, witness)
+    if cache is None:
+        result = successful(label, None, stats, heuristic, budget, depth)
+    else:
+        key = frozenset(label)  # before solving, successful() changes the label
+        result = cache.get(key)
+        if result is None:
+            result = successful(label, cache, stats, heuristic, budget, depth)
+            cache.put(key, result)
+    if heuristic is not None:
+        heuristic.successor(witness, result)
+    return result
+
+
 example_formula = Diamond(And(Diamond(Atom("p")), Diamond(Not(Atom("p"))))).normal_form()
 example_label_1 = {example_formula}  # Python built-in set
 example_label_2 = normalized({Box(Implication(Atom("q"), Diamond(Atom("p")))),
                               Diamond(Atom("q")), Box(Box(Not(Atom("p"))))})
 
 
+# the available tableau implementations. They all take a normalized label (and optionally a SatCache, a Stats, a
+# Heuristic and a Budget), and return whether it is satisfiable
+ENGINES = {
+    "recursive": successful,  # the original one, on sets of formulae
+    "bits": successful_bits,  # labels as bitmasks over the closure of the input, see Closure.py
+    "trail": Trail.successful_trail,  # one label, changed in place and restored from a trail. See Trail.py
+    "backjump": Trail.successful_backjumping,  # the trail engine, skipping (¬∧) branches that cannot help
+    "dpll": Dpll.successful_dpll,  # clause learning for the propositional part of each world, see Dpll.py
+}
+
+
+# normalizes the label and decides it with one of the ENGINES. With a cache the whole label is looked up as well,
+# so repeated labels of a file are answered without any tableau. simplify runs Simplify.simplified in between
+# heuristic is one of Heuristics.HEURISTICS, a new one for every label
+# with a store, the answer is looked up on disk first, and put there once it is solved (see Store.py)
+# with a budget, the answer is None (unknown) if the label cannot be decided within it (see Budget.py)
+# with a finder, a small model is looked for before the tableau. If there is one, the label is satisfiable
+def decide(label: set[Formula], engine: str = "recursive", cache: SatCache | None = None,
+           stats: Stats | None = None, simplify: bool = False, heuristic: str = "size",
+           store: ResultStore | None = None, budget: Budget | None = None,
+           finder: ModelFinder | None = None) -> bool | None:
+    if stats is None:
+        label = normalized(label)
+        if simplify:
+            label = Simplify.simplified(label)
+    else:
+        start = time.perf_counter()
+        label = normalized(label)
+        stats.time("normalize", time.perf_counter() - start)
+        if simplify:
+            start = time.perf_counter()
+            label = Simplify.simplified(label)
+            stats.time("simplify", time.perf_counter() - start)
+    if store is not None:
+        stored_key = store.key(label)
+        result = store.get(stored_key)
+        if result is not None:
+            return result
+        start = time.perf_counter()
+    try:
+        if budget is not None:
+            budget.check()
+        if finder is not None and __find_model(label, finder, stats):
+            result = True
+        elif cache is None:
+            result = __solve(label, engine, None, stats, heuristic, budget)
+        else:
+            key = frozenset(label)
+            result = cache.get(key)
+            if result is None:
+                result = __solve(label, engine, cache, stats, heuristic, budget)
+                cache.put(key, result)
+    except BudgetExceeded:
+        return None
+    if store is not None:
+        store.put(stored_key, result, time.perf_counter() - start, engine)
+    return result
+
+
+def __find_model(label: set[Formula], finder: ModelFinder, stats: Stats | None) -> bool:
+    if stats is None:
+        return finder.find(label) is not None
+    start = time.perf_counter()
+    found = finder.find(label) is not None
+    stats.time("model search", time.perf_counter() - start)
+    return found
+
+
+def __solve(label: set[Formula], engine: str, cache: SatCache | None, stats: Stats | None, heuristic: str,
+            budget: Budget | None) -> bool:
+    if stats is None:
+        return ENGINES[engine](label, cache, None, HEURISTICS[heuristic](), budget)
+    start = time.perf_counter()
+    try:
+        return ENGINES[engine](label, cache, stats, HEURISTICS[heuristic](), budget)
+    finally:  # the time spent counts, even if the budget ran out
+        stats.time("solve", time.perf_counter() - start)
+
+
+# between labels that share nothing: once the intern table holds more than FORGET_AFTER formulae, forget them (see
+# Formula.forget_formulae), and empty the cache as well. Its labels are made of the old nodes, nothing will match them
+FORGET_AFTER = 1_000_000
+
+
+def forget_if_large(cache: SatCache | None):
+    if Formula.interned() > FORGET_AFTER:
+        forget_formulae()
+        if cache is not None:
+            cache.clear()
+
+
+# decide labels one after another, as they come in. Takes (index, label) pairs, e.g. from Parser.iter_file,
+# and yields (index, label, answer, time in seconds). Parallel.decide_all does the same with several processes
+# with stats, the time it takes to get the next label from labels counts as parsing
+# budget makes the budget of each label, given its index, right before it is decided. The answer may then be None
+def decide_stream(labels, engine: str = "recursive", cache: SatCache | None = None, stats: Stats | None = None,
+                  heuristic: str = "size", store: ResultStore | None = None,
+                  budget: Callable[[int], Budget] | None = None, finder: ModelFinder | None = None):
+    labels = iter(labels)
+    while True:
+        forget_if_large(cache)  # before the next label is even parsed, so it is made of new nodes only
+        start = time.perf_counter()
+        index, label = next(labels, (None, None))
+        if index is None:
+            return
+        if stats is not None:
+            stats.time("parse", time.perf_counter() - start)
+        start = time.perf_counter()
+        satisfiable = decide(label, engine, cache, stats, heuristic=heuristic, store=store,
+                             budget=None if budget is None else budget(index), finder=finder)
+        yield index, label, satisfiable, time.perf_counter() - start
+
+
+# simplifies labels as they come in, between the parser and decide_stream (or Parallel.decide_all). Takes and yields
+# (index, label) pairs. For every index, originals gets the label as it was, and its size before and after, in
+# distinct sub-formulae (see Formula.closure_size). Whoever prints the answers should pop them from there
+def simplify_stream(labels, originals: dict[int, tuple[set[Formula], int, int]], stats: Stats | None = None):
+    for index, label in labels:
+        start = time.perf_counter()
+        normal = normalized(label)
+        simple = Simplify.simplified(normal)
+        if stats is not None:
+            stats.time("simplify", time.perf_counter() - start)
+        originals[index] = label, closure_size(normal), closure_size(simple)
+        yield index, simple
+
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.WARNING, filename="reasoner.log", encoding='utf-8')
-    if sys.argv[1] == "-label":
-        label = Parser.parse_label_str(sys.argv[2])
-        if len(label) <= 100:
-            answer = f"{show(label)} is "
-        else:
-            answer = f"Label is "
-        if successful(normalized(label)):
-            answer = answer + "satisfiable"
+    arg_parser = argparse.ArgumentParser(description="Decides satisfiability of labels in the modal logic K")
+    arg_parser.add_argument("file", nargs="?",
+                            help="input file, containing one label per line, or compiled by Corpus.py. - reads stdin")
+    arg_parser.add_argument("-label", help="decide this single label instead of a file")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="recursive", help="tableau implementation to use")
+    arg_parser.add_argument("--heuristic", choices=HEURISTICS, default="size",
+                            help="which branches to try first, see Heuristics.py")
+    arg_parser.add_argument("--cache-size", type=int, default=0,
+                            help="remember up to this many decided labels, shared by all labels of the file")
+    arg_parser.add_argument("--store", metavar="FILE",
+                            help="SQLite file of answers from earlier runs, looked up before and filled after solving")
+    arg_parser.add_argument("--store-size", type=int, default=1_000_000,
+                            help="with --store, keep at most this many answers, the least recently used go first")
+    arg_parser.add_argument("--store-max-age", type=float, metavar="DAYS",
+                            help="with --store, drop answers that were not used for this many days")
+    arg_parser.add_argument("--time-limit", type=float, metavar="SECONDS",
+                            help="per label: give up after this long, the verdict is then unknown. See Budget.py")
+    arg_parser.add_argument("--node-limit", type=int, help="per label: give up after expanding this many nodes")
+    arg_parser.add_argument("--memory-limit", type=float, metavar="MB",
+                            help="per label: give up once the process uses this much memory")
+    arg_parser.add_argument("--total-time", type=float, metavar="SECONDS",
+                            help="for the whole input: once it is used up, all remaining labels are unknown")
+    arg_parser.add_argument("--total-nodes", type=int, help="for the whole input, like --total-time")
+    arg_parser.add_argument("--retry", type=float, metavar="FACTOR",
+                            help="try unknown labels again at the end, with FACTOR times the per-label limits")
+    arg_parser.add_argument("--model-search", type=int, metavar="WORLDS",
+                            help="look for a model of up to this many worlds before the tableau, see ModelFinder.py")
+    arg_parser.add_argument("--jobs", type=int, default=1, help="number of worker processes, see Parallel.py")
+    arg_parser.add_argument("--split-threshold", type=int, default=200,
+                            help="with --jobs, labels with this many sub-formulae are split up between the workers")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="print one JSON object (index, verdict, time) per label instead of text")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="print rule counts, clashes, depth, label size, cache and timing as JSON to stderr")
+    arg_parser.add_argument("--simplify", action="store_true",
+                            help="simplify the labels before the tableau and report how much smaller they got")
+    arg_parser.add_argument("--trace", action="store_true",
+                            help="log every rule application and clash to reasoner.log (slow)")
+    args = arg_parser.parse_args()
+    if args.file is None and args.label is None:
+        arg_parser.error("give a file of labels (- for stdin) or a single -label")
+    if args.label is None and args.file != "-" and not os.path.isfile(args.file):
+        arg_parser.error(f"no such file: {args.file}")
+    if args.jobs > 1 and args.total_nodes is not None:
+        arg_parser.error("--total-nodes cannot be counted over several processes, use --total-time with --jobs")
+    if args.trace:
+        logging.getLogger().setLevel(logging.INFO)
+        stats = Stats(lambda event, depth, formula: logging.info(f"{'  ' * depth}{event} {formula or ''}"))
+    else:
+        stats = Stats() if args.stats else None
+    cache = SatCache(args.cache_size) if args.cache_size > 0 and args.jobs <= 1 else None
+    finder = ModelFinder(args.model_search) if args.model_search is not None and args.jobs <= 1 else None
+    store = None
+    if args.store is not None:
+        store = ResultStore(args.store, args.store_size,
+                            None if args.store_max_age is None else args.store_max_age * 24 * 60 * 60)
+
+    # a line that cannot be parsed gets an error as its answer, right when the parser gets to it. The rest goes on
+    def unparsable(n: int, message: str):
+        if args.json:
+            print(json.dumps({"index": n, "verdict": "error", "error": message}), flush=True)
         else:
-            answer = answer + "not satisfiable"
-        print(answer)
+            print(f"{'Label' if args.label is not None else f'Label {n}'} cannot be parsed: {message}", flush=True)
+
+    # labels are parsed, solved and printed one line at a time, so the first answer does not wait for the whole file
+    if args.label is not None:
+        labels = Parser.iter_lines([args.label], unparsable)
+    elif args.file == "-":
+        labels = Parser.iter_lines(sys.stdin, unparsable)
+    elif Corpus.is_corpus(args.file):
+        labels = Corpus.iter_corpus(args.file)
     else:
-        labels = Parser.parse_file(sys.argv[1])
-        for n, label in enumerate(labels):
+        labels = Parser.iter_file(args.file, unparsable)
+    originals: dict[int, tuple[set[Formula], int, int]] = {}  # with --simplify: the label as it was, size before, after
+    if args.simplify:
+        labels = simplify_stream(labels, originals, stats)
+
+    limited = any(limit is not None for limit in (args.time_limit, args.node_limit, args.memory_limit,
+                                                   args.total_time, args.total_nodes))
+    total = Budget(args.total_time, args.total_nodes) if limited else None
+    budgets: dict[int, Budget] = {}  # the budget of every label, until its answer is printed
+
+    # the per-label limits, times factor
+    def limits(factor: float) -> tuple[float | None, int | None, int | None]:
+        return (None if args.time_limit is None else args.time_limit * factor,
+                None if args.node_limit is None else int(args.node_limit * factor),
+                None if args.memory_limit is None else int(args.memory_limit * factor * 2 ** 20))
+
+    def solve(labels, factor: float):
+        if args.jobs > 1:
+            import Parallel  # Parallel imports this module, so only import it when needed
+            return Parallel.decide_all(labels, args.engine, args.jobs, args.cache_size, args.split_threshold, stats,
+                                       args.heuristic, store, limits(factor) if limited else None, total,
+                                       args.model_search, budgets)
+
+        def budget(index: int) -> Budget:
+            budgets[index] = Budget(*limits(factor), parent=total)
+            return budgets[index]
+
+        return decide_stream(labels, args.engine, cache, stats, args.heuristic, store, budget if limited else None,
+                             finder)
+
+    # unknown labels are held back, and tried again after all others
+    def with_retries(answers):
+        retries = []
+        for answer in answers:
+            if answer[2] is None and args.retry is not None:
+                retries.append(answer[:2])
+            else:
+                yield answer
+        if retries:
+            yield from solve(retries, args.retry)
+
+    for n, label, satisfiable, seconds in with_retries(solve(labels, 1.0)):
+        shrunk = ""
+        if args.simplify:
+            decided = Simplify.decided(label) is not None
+            label, before, after = originals.pop(n)
+            shrunk = f" (simplified from {before} to {after} sub-formulae{', decided by that' if decided else ''})"
+        budget = budgets.pop(n, None)
+        if args.json:
+            verdict = "unknown" if satisfiable is None else "sat" if satisfiable else "unsat"
+            answer = {"index": n, "verdict": verdict, "time": seconds}
+            if satisfiable is None and budget is not None:
+                answer.update(exceeded=budget.exceeded, nodes=budget.nodes)
+            if args.simplify:
+                answer.update(size=before, simplified_size=after, decided_by_simplification=decided)
+            answer = json.dumps(answer)
+        else:
             if len(label) <= 100:
                 answer = f"{show(label)} is "
+            elif args.label is not None:
+                answer = f"Label is "
             else:
                 answer = f"Label {n} is "
-            if successful(normalized(label)):
+            if satisfiable is None:
+                answer = answer + "unknown"
+                if budget is not None:
+                    answer = answer + f" (out of {budget.exceeded} after {budget.nodes} nodes)"
+            elif satisfiable:
                 answer = answer + "satisfiable"
             else:
                 answer = answer + "not satisfiable"
-            print(answer)
+            answer = answer + shrunk
+        print(answer, flush=True)
+
+    # with --jobs the cache and model search counters live in the worker processes
+    if args.stats:
+        report = stats.to_dict()
+        if cache is not None:
+            report["cache"] = cache.counters()
+        if store is not None:
+            report["store"] = store.counters()
+        if finder is not None:
+            report["model_search"] = finder.counters()
+        print(json.dumps(report), file=sys.stderr)
+    else:
+        if cache is not None:
+            print(f"Cache: {cache}", file=sys.stderr)
+        if store is not None:
+            print(f"Store: {store}", file=sys.stderr)
+    if store is not None:
+        store.close()
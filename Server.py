@@ -0,0 +1,391 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, Future
+from Cache import SatCache
+from Stats import Stats
+from Store import ResultStore
+from Budget import Budget
+from Heuristics import HEURISTICS
+from ModelFinder import ModelFinder
+import Parser
+import Reasoner
+
+"""
+A reasoner that stays up: JSON-RPC 2.0, one request or response per line, on stdin/stdout or on a Unix socket.
+
+    python Server.py [--socket reasoner.sock] [--jobs 2] [--cache-size 100000] [--store answers.db] ...
+
+Methods:
+- decide {"label": "◇ p, □ ¬ p", "engine": ..., "heuristic": ..., "simplify": ..., "model_search": ...,
+  "time_limit": ..., "node_limit": ..., "memory_limit": ...}, everything but the label optional, with the defaults
+  from the command line. model_search is the number of worlds for ModelFinder, null for no model search. Limits are
+  non-negative numbers (node_limit an integer), null for none
+  Result: {"verdict": "sat"|"unsat"|"unknown", "time": <seconds in the worker>, "nodes": ..., "exceeded": ...}
+- cancel {"id": <id of a decide on the same connection>}. Result: {"cancelled": whether it was still running}.
+  The decide itself is then answered with the error REQUEST_CANCELLED
+- health: {"status": "ok", "uptime": ..., "in_flight": ..., "jobs": ...}
+- stats: request and verdict counts, latencies, the SatCache counters of every worker as of its last answer, and
+  with --stats the merged Stats of all requests
+- shutdown: stops taking requests, answers the running ones and exits
+
+Labels are parsed and decided in a pool of worker processes, which keep their SatCache (and their connection to the
+store) for as long as the server runs. The process that reads the requests only hands them out, so requests are
+pipelined: a client can send the next one before the last is answered, and answers come back as soon as they are
+done, not in order. Match them by id.
+
+Running requests cannot be interrupted from the outside. Instead every one gets a slot in an array of flags shared
+with the workers, and its Budget asks its flag along with the clock (see Budget.py). A cancel sets the flag, and the
+engine stops within a few nodes. Requests that did not start yet are just dropped. A connection that goes away
+cancels everything it still has running.
+"""
+
+SLOTS = 4096  # requests that can be cancelled while running. More can be in flight, but not cancelled once started
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_CANCELLED = -32800
+
+# the state of a worker. One underscore only, ReasoningServer would mangle two
+_cache: SatCache | None = None
+_store: ResultStore | None = None
+_stats = False
+_flags = None  # the shared cancel flags, one byte per slot
+_finders: dict[int, ModelFinder] = {}  # by the number of worlds, made when first asked for
+
+
+def _init_worker(cache_size: int, store: str | None, stats: bool, flags):
+    global _cache, _store, _stats, _flags
+    _cache = SatCache(cache_size) if cache_size > 0 else None
+    _store = ResultStore(store) if store is not None else None
+    _stats = stats
+    _flags = flags
+
+
+# runs in the workers. Parse errors come back as the ValueError of the Parser
+def _decide(text: str, engine: str, heuristic: str, simplify: bool, model_worlds: int | None,
+            limits: tuple[float | None, int | None, int | None], slot: int | None) -> tuple[dict, Stats | None]:
+    Reasoner.forget_if_large(_cache)  # requests share no formulae, only the cache
+    label = Parser.parse_label_str(text)
+    finder = None
+    if model_worlds is not None:
+        finder = _finders.get(model_worlds)
+        if finder is None:
+            finder = _finders[model_worlds] = ModelFinder(model_worlds)
+    budget = Budget(*limits, cancelled=None if slot is None else lambda: _flags[slot] != 0)
+    stats = Stats() if _stats else None
+    start = time.perf_counter()
+    satisfiable = Reasoner.decide(label, engine, _cache, stats, simplify, heuristic, _store, budget, finder)
+    answer = {"verdict": "unknown" if satisfiable is None else "sat" if satisfiable else "unsat",
+              "time": time.perf_counter() - start, "nodes": budget.nodes}
+    if satisfiable is None:
+        answer["exceeded"] = budget.exceeded
+    answer["worker"] = os.getpid()
+    answer["cache"] = None if _cache is None else _cache.counters()
+    return answer, stats
+
+
+# what JSON-RPC allows as an id. Fractions are allowed as well, but discouraged, and not accepted here
+def is_id(value) -> bool:
+    return value is None or isinstance(value, str) or isinstance(value, int) and not isinstance(value, bool)
+
+
+class RequestError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+# where the answers of one client go. send() may be called from any thread
+class Connection:
+    __ids = iter(range(sys.maxsize))
+
+    def __init__(self, write):
+        self.id = next(Connection.__ids)
+        self.write = write  # takes one line
+        self.lock = threading.Lock()
+
+    def send(self, message: dict):
+        line = json.dumps(message, ensure_ascii=False) + "\n"
+        with self.lock:
+            try:
+                self.write(line)
+            except (OSError, ValueError):  # the client is gone, nobody wants the answer any more
+                pass
+
+
+class ReasoningServer:
+    def __init__(self, jobs: int = 1, cache_size: int = 100_000, store: str | None = None, stats: bool = False,
+                 engine: str = "recursive", heuristic: str = "size", simplify: bool = False,
+                 limits: tuple[float | None, int | None, int | None] = (None, None, None),
+                 model_worlds: int | None = None):
+        self.jobs = jobs
+        self.defaults = {"engine": engine, "heuristic": heuristic, "simplify": simplify, "model_search": model_worlds}
+        self.limits = limits
+        self.flags = multiprocessing.Array("b", SLOTS, lock=False)
+        self.pool = ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                        initargs=(cache_size, store, stats, self.flags))
+        # start all workers now. The pool would fork them on demand, and a worker forked while a client is connected
+        # keeps a copy of its socket
+        for future in [self.pool.submit(os.getpid) for _ in range(jobs)]:
+            future.result()
+        self.lock = threading.Lock()  # for everything below
+        self.free = list(range(SLOTS))
+        # (connection id, request id) -> the future and the cancel slot of a running decide
+        self.running: dict[tuple[int, object], tuple[Future, int | None]] = {}
+        self.started = time.monotonic()
+        self.requests = 0
+        self.verdicts = {"sat": 0, "unsat": 0, "unknown": 0}
+        self.cancelled = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.workers: dict[int, dict | None] = {}  # pid -> its cache counters
+        self.stats = Stats() if stats else None
+        self.stopping = threading.Event()
+
+    # one line from a client. Everything but decide is answered right away
+    def handle(self, line: str, connection: Connection):
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RequestError(PARSE_ERROR, f"not JSON: {e}") from None
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                raise RequestError(INVALID_REQUEST, "a request is an object with a method")
+            if not is_id(request.get("id")):
+                raise RequestError(INVALID_REQUEST, "an id is a string, a number or null")
+            request_id = request.get("id")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RequestError(INVALID_PARAMS, "params have to be an object")
+            with self.lock:
+                self.requests += 1
+            match request["method"]:
+                case "decide":
+                    self.decide(request_id, params, connection)
+                    return
+                case "cancel":
+                    if not is_id(params.get("id")):
+                        raise RequestError(INVALID_PARAMS, "cancel needs the id of a request")
+                    result = {"cancelled": self.cancel((connection.id, params.get("id")))}
+                case "health":
+                    result = {"status": "stopping" if self.stopping.is_set() else "ok",
+                              "uptime": time.monotonic() - self.started, "in_flight": len(self.running),
+                              "jobs": self.jobs}
+                case "stats":
+                    result = self.counters()
+                case "shutdown":
+                    self.stopping.set()
+                    result = {"status": "stopping"}
+                case method:
+                    raise RequestError(METHOD_NOT_FOUND, f"no method {method}")
+            if request_id is not None:
+                connection.send({"jsonrpc": "2.0", "id": request_id, "result": result})
+        except RequestError as e:
+            self.__error(connection, request_id, e.code, str(e))
+        except Exception as e:  # a bug, but it must not take the connection down with it
+            logging.exception("request %r failed", line)
+            self.__error(connection, request_id, INTERNAL_ERROR, repr(e))
+
+    def decide(self, request_id, params: dict, connection: Connection):
+        if request_id is None:
+            raise RequestError(INVALID_REQUEST, "decide needs an id, its answer would have nowhere to go")
+        if self.stopping.is_set():
+            raise RequestError(INVALID_REQUEST, "the server is shutting down")
+        label = params.get("label")
+        if not isinstance(label, str):
+            raise RequestError(INVALID_PARAMS, "label has to be a string")
+        engine = params.get("engine", self.defaults["engine"])
+        heuristic = params.get("heuristic", self.defaults["heuristic"])
+        if engine not in Reasoner.ENGINES:
+            raise RequestError(INVALID_PARAMS, f"engine has to be one of {', '.join(Reasoner.ENGINES)}")
+        if heuristic not in HEURISTICS:
+            raise RequestError(INVALID_PARAMS, f"heuristic has to be one of {', '.join(HEURISTICS)}")
+        model_worlds = params.get("model_search", self.defaults["model_search"])
+        if model_worlds is not None and (isinstance(model_worlds, bool) or not isinstance(model_worlds, int)
+                                         or model_worlds < 1):
+            raise RequestError(INVALID_PARAMS, "model_search has to be a positive number of worlds, or null")
+        time_limit = self.__limit(params, "time_limit", float | int, self.limits[0])
+        node_limit = self.__limit(params, "node_limit", int, self.limits[1])
+        memory_limit = self.__limit(params, "memory_limit", float | int, self.limits[2])
+        if "memory_limit" in params and memory_limit is not None:  # in MB, the default is in bytes already
+            memory_limit = int(memory_limit * 2 ** 20)
+        limits = (time_limit, node_limit, memory_limit)
+        key = (connection.id, request_id)
+        received = time.monotonic()
+        with self.lock:
+            if key in self.running:
+                raise RequestError(INVALID_REQUEST, f"request {request_id} is still running")
+            slot = self.free.pop() if self.free else None
+            future = self.pool.submit(_decide, label, engine, heuristic,
+                                      bool(params.get("simplify", self.defaults["simplify"])), model_worlds, limits,
+                                      slot)
+            self.running[key] = future, slot
+        future.add_done_callback(lambda done: self.__answer(key, done, connection, received))
+
+    # a limit of the request, or the default if it has none. null is no limit
+    @staticmethod
+    def __limit(params: dict, name: str, kind, default):
+        if name not in params:
+            return default
+        value = params[name]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, kind) or value < 0):
+            kind_name = "integer" if kind is int else "number"
+            raise RequestError(INVALID_PARAMS, f"{name} has to be a non-negative {kind_name}")
+        return value
+
+    # True if the request was still running
+    def cancel(self, key: tuple[int, object]) -> bool:
+        with self.lock:
+            entry = self.running.get(key)
+            if entry is None:
+                return False
+            future, slot = entry
+            if slot is not None:
+                self.flags[slot] = 1
+        future.cancel()  # outside the lock, its callback runs right away if that works
+        return True
+
+    # everything the connection still has running
+    def cancel_all(self, connection: Connection):
+        with self.lock:
+            keys = [key for key in self.running if key[0] == connection.id]
+        for key in keys:
+            self.cancel(key)
+
+    def __answer(self, key: tuple[int, object], future: Future, connection: Connection, received: float):
+        with self.lock:
+            _, slot = self.running.pop(key)
+            if slot is not None:
+                self.flags[slot] = 0
+                self.free.append(slot)
+        request_id = key[1]
+        if future.cancelled():
+            self.__error(connection, request_id, REQUEST_CANCELLED, "cancelled before it started")
+            return
+        try:
+            answer, stats = future.result()
+        except ValueError as e:  # from the parser
+            self.__error(connection, request_id, INVALID_PARAMS, f"cannot parse the label: {e}")
+            return
+        except Exception as e:
+            self.__error(connection, request_id, INTERNAL_ERROR, repr(e))
+            return
+        latency = time.monotonic() - received
+        with self.lock:
+            self.workers[answer.pop("worker")] = answer.pop("cache")
+            if stats is not None and self.stats is not None:
+                self.stats.merge(stats)
+            if answer.get("exceeded") == "cancel":
+                self.cancelled += 1
+            else:
+                self.verdicts[answer["verdict"]] += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        if answer.get("exceeded") == "cancel":
+            self.__error(connection, request_id, REQUEST_CANCELLED, f"cancelled after {answer['nodes']} nodes")
+        else:
+            connection.send({"jsonrpc": "2.0", "id": request_id, "result": answer})
+
+    def __error(self, connection: Connection, request_id, code: int, message: str):
+        with self.lock:
+            self.errors += code != REQUEST_CANCELLED
+        connection.send({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}})
+
+    def counters(self) -> dict:
+        with self.lock:
+            answered = sum(self.verdicts.values())
+            counters = {"uptime": time.monotonic() - self.started, "requests": self.requests,
+                        "in_flight": len(self.running), "verdicts": dict(self.verdicts), "cancelled": self.cancelled,
+                        "errors": self.errors, "mean_latency": self.latency_total / answered if answered else None,
+                        "max_latency": self.latency_max,
+                        "workers": {str(pid): cache for pid, cache in self.workers.items()}}
+            if self.stats is not None:
+                counters["stats"] = self.stats.to_dict()
+        return counters
+
+    # wait for the running requests, then stop the workers
+    def close(self):
+        self.stopping.set()
+        self.pool.shutdown(wait=True)
+
+
+def serve_stdio(server: ReasoningServer):
+    def write(line: str):
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+    connection = Connection(write)
+    for line in sys.stdin:
+        if line.strip():
+            server.handle(line, connection)
+        if server.stopping.is_set():
+            break
+    server.close()
+
+
+def serve_socket(server: ReasoningServer, path: str):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(line: str):
+                self.wfile.write(line.encode("utf-8"))
+                self.wfile.flush()
+
+            connection = Connection(write)
+            try:
+                for line in self.rfile:
+                    if line.strip():
+                        server.handle(line.decode("utf-8", errors="replace"), connection)
+            finally:  # gone, so nobody is waiting for its answers
+                server.cancel_all(connection)
+
+    if os.path.exists(path):  # left over from a server that did not clean up
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as listener:
+        listener.daemon_threads = True
+        threading.Thread(target=lambda: (server.stopping.wait(), listener.shutdown()), daemon=True).start()
+        try:
+            listener.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    os.remove(path)
+    server.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, filename="reasoner.log", encoding='utf-8')
+    arg_parser = argparse.ArgumentParser(description="Decides labels of the modal logic K as a JSON-RPC server")
+    arg_parser.add_argument("--socket", metavar="PATH", help="listen on this Unix socket instead of stdin/stdout")
+    arg_parser.add_argument("--jobs", type=int, default=1, help="worker processes")
+    arg_parser.add_argument("--cache-size", type=int, default=100_000, help="SatCache per worker, 0 for none")
+    arg_parser.add_argument("--store", metavar="FILE", help="SQLite file of answers, shared by the workers")
+    arg_parser.add_argument("--engine", choices=Reasoner.ENGINES, default="recursive", help="unless a request says")
+    arg_parser.add_argument("--heuristic", choices=HEURISTICS, default="size", help="unless a request says")
+    arg_parser.add_argument("--simplify", action="store_true", help="unless a request says")
+    arg_parser.add_argument("--model-search", type=int, metavar="WORLDS",
+                            help="look for a model of up to this many worlds first, unless a request says")
+    arg_parser.add_argument("--time-limit", type=float, metavar="SECONDS", help="per request, unless it says")
+    arg_parser.add_argument("--node-limit", type=int, help="per request, unless it says")
+    arg_parser.add_argument("--memory-limit", type=float, metavar="MB", help="per request, unless it says")
+    arg_parser.add_argument("--stats", action="store_true", help="count rules, clashes etc. for the stats method")
+    args = arg_parser.parse_args()
+    reasoning_server = ReasoningServer(args.jobs, args.cache_size, args.store, args.stats, args.engine,
+                                       args.heuristic, args.simplify,
+                                       (args.time_limit, args.node_limit,
+                                        None if args.memory_limit is None else int(args.memory_limit * 2 ** 20)),
+                                       args.model_search)
+    if args.socket is None:
+        serve_stdio(reasoning_server)
+    else:
+        serve_socket(reasoning_server, args.socket)
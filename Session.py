@@ -0,0 +1,67 @@
+import time
+from collections.abc import Iterable
+from Formula import *
+from Cache import SatCache
+from Stats import Stats
+from Dpll import World
+
+"""
+Many questions against the same background label, each with a few formulae of its own:
+
+    session = ReasonerSession(background)
+    session.check({φ})          # is background ∪ {φ} satisfiable?
+    session.push(ψ)             # from now on, ψ is part of every question
+    session.check_many([{φ_1}, {φ_2}])
+    session.pop()               # ψ is gone again
+
+Reasoner.decide would normalize and solve the whole label for every question. A session normalizes the background
+once, and keeps a single Dpll.World of it. Its level 0, i.e. the background with everything unit propagation gets out
+of it, is computed once as well. Pushed formulae and those of a question are only assumptions of that world (see
+Dpll.py), so nothing about them has to be undone afterwards. What the world learned (clauses, and which of its (¬□)
+successors are unsatisfiable, with their cores) stays for the next question, and so does the SatCache of the
+successors further down. A question then costs normalizing and encoding its own formulae, plus the search that is
+actually new.
+
+Nothing is ever forgotten: learned clauses and remembered successors pile up over the lifetime of a session. Start a
+new one when the background changes.
+"""
+
+
+class ReasonerSession:
+    def __init__(self, background: Iterable[Formula] = (), cache_size: int = 100_000, stats: Stats | None = None):
+        self.cache = SatCache(cache_size) if cache_size > 0 else None
+        self.stats = stats
+        self.world = World({formula.normal_form() for formula in background}, self.cache, stats)
+        self.frames: list[list[Formula]] = []  # the pushed formulae, normalized, one list per push
+
+    # normal forms of the formulae, defined in the world so they can be assumed
+    def __assumable(self, formulae: Iterable[Formula]) -> list[Formula]:
+        if self.stats is not None:
+            start = time.perf_counter()
+        normal = list(dict.fromkeys(formula.normal_form() for formula in formulae))
+        for formula in normal:
+            self.world.define(formula)
+        if self.stats is not None:
+            self.stats.time("normalize", time.perf_counter() - start)
+        return normal
+
+    # add formulae to every following question, until the matching pop()
+    def push(self, *formulae: Formula):
+        self.frames.append(self.__assumable(formulae))
+
+    # returns the formulae of the last push, in normal form
+    def pop(self) -> list[Formula]:
+        return self.frames.pop()
+
+    # whether the background, the pushed formulae and the label are satisfiable together
+    def check(self, label: Iterable[Formula] = ()) -> bool:
+        assumptions = [formula for frame in self.frames for formula in frame] + self.__assumable(label)
+        if self.stats is None:
+            return self.world.solve(assumptions)
+        start = time.perf_counter()
+        result = self.world.solve(assumptions)
+        self.stats.time("solve", time.perf_counter() - start)
+        return result
+
+    def check_many(self, labels: Iterable[Iterable[Formula]]) -> list[bool]:
+        return [self.check(label) for label in labels]
@@ -0,0 +1,230 @@
+from Formula import *
+from Formula import _negated
+
+"""
+Cheap rewriting of normalized labels before the tableau, into an equisatisfiable and usually much smaller label.
+
+Within every conjunction (the label itself counts as one):
+- ⊤ is dropped, and ⊥ (i.e. ¬⊤) or φ together with ¬φ make the whole conjunction ⊥
+- nested conjunctions are flattened, and every conjunct is kept only once
+- a disjunction ¬(φ_1 ∧ ... ∧ φ_n) with one of its disjuncts ¬φ_i among the conjuncts is dropped (absorption).
+  Disjuncts whose negation φ_i is a conjunct are removed from it, a disjunction that loses all of them is ⊥
+- a disjunction whose disjuncts include all of those of another one is dropped (subsumption)
+- □⊤ is ⊤
+A tableau would find all of that out as well, but only after branching, and again in every branch.
+
+Finally pure literals go. K has tree models, and in those a world at modal depth d only ever evaluates the occurrences
+of the label at depth d (under exactly d boxes or diamonds). So if an atom only occurs positively among those, it can
+just be true in all worlds at that depth: it is replaced by ⊤ there. If it only occurs negatively, by ⊥. This does not
+keep the label equivalent, only (un)satisfiable, and it may make more literals pure, so it is repeated until there are
+none.
+
+A label that is decided by all that is simplified to the empty label (satisfiable) or {⊥} (unsatisfiable).
+
+Formulae are interned, so the simplified form of every node is remembered and shared sub-formulae are done only once.
+As everywhere else, nothing recurses. Removing disjuncts makes new conjunctions, which have to be simplified in turn
+before the one they came from is finished. They are simply put on the stack, in front of it.
+
+Merging all □φ_i of a conjunction into one □(φ_1 ∧ ... ∧ φ_n) would be sound as well, but it is left out on purpose.
+The tableau collects the boxes of a world anyway, and the merged conjunctions are new nodes that share nothing with the
+rest of the DAG (and with the SatCache). It made the LWB k_ph formulae about 40% slower.
+"""
+
+
+# the conjuncts of nested conjunctions, left to right
+def _conjuncts(formula: Formula) -> list[Formula]:
+    result = []
+    stack = [formula]
+    while stack:
+        formula = stack.pop()
+        if isinstance(formula, And):
+            stack.extend(reversed(formula.sub_formulae))
+        else:
+            result.append(formula)
+    return result
+
+
+def _conjunction(formulae: list[Formula]) -> Formula:
+    if not formulae:
+        return TOP
+    result = formulae[-1]
+    for formula in reversed(formulae[:-1]):
+        result = And(formula, result)
+    return result
+
+
+# True or False if the simplified label is decided already, None if the tableau still has some work to do
+def decided(label: set[Formula]) -> bool | None:
+    if not label:
+        return True
+    if BOT in label:
+        return False
+    return None
+
+
+class _Simplifier:
+    def __init__(self):
+        self.simple: dict[Formula, Formula] = {}  # formula -> its simplified form
+        self.missing: list[Formula] = []  # new formulae a simplification step is waiting for
+
+    # the simplified form, if it is known already. Otherwise the formula is noted as missing
+    def of(self, formula: Formula) -> Formula | None:
+        result = self.simple.get(formula)
+        if result is None:
+            self.missing.append(formula)
+        return result
+
+    # simplify the formulae and everything they need, post-order
+    def run(self, formulae: list[Formula]):
+        stack = list(formulae)
+        while stack:
+            formula = stack[-1]
+            if formula in self.simple:
+                stack.pop()
+                continue
+            missing = [sub_formula for sub_formula in formula.sub_formulae if sub_formula not in self.simple]
+            if missing:
+                stack.extend(missing)
+                continue
+            result = self.step(formula)
+            if result is None:  # comes back to it after the missing ones
+                stack.extend(self.missing)
+                self.missing = []
+                continue
+            stack.pop()
+            self.simple[formula] = result
+
+    # one node, whose sub-formulae are simplified already. None if it needs a new formula simplified first
+    def step(self, formula: Formula) -> Formula | None:
+        if isinstance(formula, Not):
+            return _negated(self.simple[formula.sub_formulae[0]])
+        if isinstance(formula, Box):
+            boxed = self.simple[formula.sub_formulae[0]]
+            return boxed if isinstance(boxed, Top) else Box(boxed)
+        if isinstance(formula, And):
+            conjuncts = self.conjunction([self.simple[sub_formula] for sub_formula in formula.sub_formulae])
+            return None if conjuncts is None else _conjunction(conjuncts)
+        return formula  # atoms and ⊤
+
+    # the conjunction of simplified formulae, as a list of conjuncts. None if it needs a new formula simplified first
+    def conjunction(self, formulae: list[Formula]) -> list[Formula] | None:
+        bottom = BOT
+        conjuncts: dict[Formula, None] = {}  # a dict keeps the order, unlike a set
+
+        def add(formula: Formula) -> bool:  # False if that makes the conjunction ⊥
+            for conjunct in _conjuncts(formula):
+                if isinstance(conjunct, Top):
+                    continue
+                if _negated(conjunct) in conjuncts or conjunct == bottom:
+                    return False
+                conjuncts[conjunct] = None
+            return True
+
+        for formula in formulae:
+            if not add(formula):
+                return [bottom]
+
+        # absorption and removal of disjuncts, until nothing changes
+        disjuncts = {}
+        changed = True
+        while changed:
+            changed = False
+            for clause in [conjunct for conjunct in conjuncts if conjunct.applicable_tableaux_rule == "NotAnd"]:
+                if clause not in disjuncts:
+                    disjuncts[clause] = [_negated(conjunct) for conjunct in _conjuncts(clause.sub_formulae[0])]
+                if any(disjunct in conjuncts for disjunct in disjuncts[clause]):
+                    del conjuncts[clause]
+                    continue
+                remaining = [disjunct for disjunct in disjuncts[clause] if _negated(disjunct) not in conjuncts]
+                if len(remaining) == len(disjuncts[clause]):
+                    continue
+                if len(remaining) > 1:
+                    inner = self.of(_conjunction([_negated(disjunct) for disjunct in remaining]))
+                    if inner is None:
+                        return None
+                    remaining = [_negated(inner)]
+                del conjuncts[clause]
+                if not remaining or not add(remaining[0]):
+                    return [bottom]
+                changed = True
+
+        # subsumption, smaller disjunctions first
+        clauses = [(frozenset(disjuncts[clause]), clause) for clause in conjuncts if clause in disjuncts]
+        kept: list[frozenset[Formula]] = []
+        for clause_disjuncts, clause in sorted(clauses, key=lambda pair: len(pair[0])):
+            if any(smaller <= clause_disjuncts for smaller in kept):
+                del conjuncts[clause]
+            else:
+                kept.append(clause_disjuncts)
+        return list(conjuncts)
+
+    # the simplified label, as a list of conjuncts
+    def label(self, label: list[Formula]) -> list[Formula]:
+        formulae = label
+        while True:
+            self.run(formulae)
+            conjuncts = self.conjunction([self.simple[formula] for formula in label])
+            if conjuncts is not None:
+                return conjuncts
+            formulae = self.missing
+            self.missing = []
+
+
+# (atom, modal depth) -> ⊤ or ⊥, for the atoms that only occur positively or only negatively at that depth
+def _pure_literals(label: list[Formula]) -> dict[tuple[Formula, int], Formula]:
+    polarities: dict[tuple[Formula, int], set[bool]] = {}
+    seen = set()
+    stack = [(formula, 0, True) for formula in label]
+    while stack:
+        occurrence = stack.pop()
+        if occurrence in seen:
+            continue
+        seen.add(occurrence)
+        formula, depth, positive = occurrence
+        if isinstance(formula, Atom):
+            polarities.setdefault((formula, depth), set()).add(positive)
+        elif isinstance(formula, Not):
+            stack.append((formula.sub_formulae[0], depth, not positive))
+        elif isinstance(formula, Box):
+            stack.append((formula.sub_formulae[0], depth + 1, positive))
+        else:
+            stack.extend((sub_formula, depth, positive) for sub_formula in formula.sub_formulae)
+    return {occurrence: TOP if positive == {True} else BOT
+            for occurrence, positive in polarities.items() if len(positive) == 1}
+
+
+# the label with the pure atoms replaced, depth by depth. The result is in normal form, but not simplified
+def _substitute(label: list[Formula], pure: dict[tuple[Formula, int], Formula]) -> list[Formula]:
+    result: dict[tuple[Formula, int], Formula] = {}
+    stack = [(formula, 0) for formula in label]
+    while stack:
+        formula, depth = stack[-1]
+        if (formula, depth) in result:
+            stack.pop()
+            continue
+        inner = depth + 1 if isinstance(formula, Box) else depth
+        missing = [(sub_formula, inner) for sub_formula in formula.sub_formulae if (sub_formula, inner) not in result]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        if isinstance(formula, Atom):
+            result[(formula, depth)] = pure.get((formula, depth), formula)
+        elif formula.sub_formulae:
+            sub_formulae = [result[(sub_formula, inner)] for sub_formula in formula.sub_formulae]
+            result[(formula, depth)] = formula.__class__(*sub_formulae).normal_form()
+        else:
+            result[(formula, depth)] = formula
+    return [result[(formula, 0)] for formula in label]
+
+
+# an equisatisfiable label, as small as the rules above get it. Only call it with normalized labels
+def simplified(label: set[Formula]) -> set[Formula]:
+    simplifier = _Simplifier()
+    conjuncts = simplifier.label(list(label))
+    while decided(set(conjuncts)) is None:
+        pure = _pure_literals(conjuncts)
+        if not pure:
+            break
+        conjuncts = simplifier.label(_substitute(conjuncts, pure))
+    return set(conjuncts)
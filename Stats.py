@@ -0,0 +1,103 @@
+from collections.abc import Callable
+from Formula import *
+
+"""
+Counters for what the tableau engines do. All engines take an optional Stats object, and only ever touch it behind an
+"if stats is not None". Without one they do no bookkeeping at all, so leaving the statistics off costs nothing.
+
+Counted are the rule applications (per rule), clashes, the deepest branching point, the largest label, and with the
+backjump engine the (¬∧) branches it did not have to explore. The dpll engine has no (¬∧) rule, it counts decisions,
+unit propagations and learned clauses instead (see Dpll.py). Time per phase (parse, normalize, solve) is added by
+whoever drives the engine, e.g. Reasoner.decide_stream.
+
+A trace callback gets every event as it happens: trace(event, depth, formula). The events are the rules
+"NotNot", "And", "NotAnd" and "NotBox" with the formula they are applied to, "Clash" with one of the clashing
+formulae, and "Open" with None, for a label that is saturated and clash-free. The dpll engine adds "Decide" and
+"Propagate" with the literal that is set, and "Learn" with None.
+Depth counts the branching points above the current label, both (¬∧) branches and (¬□) successors.
+"""
+
+RULES = ("NotNot", "And", "NotAnd", "NotBox")
+
+Trace = Callable[[str, int, Formula | None], None]
+
+
+class Stats:
+    def __init__(self, trace: Trace | None = None):
+        self.rules: dict[str, int] = {rule: 0 for rule in RULES}
+        self.clashes = 0
+        self.pruned = 0  # (¬∧) branches skipped by backjumping
+        self.max_depth = 0
+        self.max_label = 0  # number of formulae
+        self.decisions = 0
+        self.propagations = 0
+        self.learned = 0  # clauses
+        self.phases: dict[str, float] = {}  # seconds
+        self.trace = trace
+
+    # a rule was applied to the formula
+    def rule(self, rule: str, depth: int, formula: Formula | None = None):
+        self.rules[rule] += 1
+        if self.trace is not None:
+            self.trace(rule, depth, formula)
+
+    def clash(self, depth: int, formula: Formula | None = None):
+        self.clashes += 1
+        if self.trace is not None:
+            self.trace("Clash", depth, formula)
+
+    def open(self, depth: int):
+        if self.trace is not None:
+            self.trace("Open", depth, None)
+
+    # a literal was set by a decision, or because it was the last one left in a clause
+    def decide(self, depth: int, literal: Formula):
+        self.decisions += 1
+        if self.trace is not None:
+            self.trace("Decide", depth, literal)
+
+    def propagate(self, depth: int, literal: Formula):
+        self.propagations += 1
+        if self.trace is not None:
+            self.trace("Propagate", depth, literal)
+
+    # a clause was learned, the search goes back to the given depth
+    def learn(self, depth: int):
+        self.learned += 1
+        if self.trace is not None:
+            self.trace("Learn", depth, None)
+
+    # a (saturated) label at the given depth
+    def node(self, depth: int, size: int):
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if size > self.max_label:
+            self.max_label = size
+
+    def time(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    # add the counters of another Stats, e.g. from a worker process
+    def merge(self, other: "Stats"):
+        for rule, count in other.rules.items():
+            self.rules[rule] += count
+        self.clashes += other.clashes
+        self.pruned += other.pruned
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.max_label = max(self.max_label, other.max_label)
+        self.decisions += other.decisions
+        self.propagations += other.propagations
+        self.learned += other.learned
+        for phase, seconds in other.phases.items():
+            self.time(phase, seconds)
+
+    def to_dict(self) -> dict:
+        return {"rules": dict(self.rules), "clashes": self.clashes, "pruned": self.pruned,
+                "max_depth": self.max_depth, "max_label": self.max_label, "decisions": self.decisions,
+                "propagations": self.propagations, "learned": self.learned, "phases": dict(self.phases)}
+
+    # the trace callback cannot be pickled in general, and is of no use in another process anyway
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["trace"] = None
+        return state
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import sqlite3
+import time
+import weakref
+from Formula import *
+
+"""
+Answers that outlive the process: a SQLite file of decided labels, for batch runs over overlapping inputs.
+
+A SatCache is keyed by the labels themselves, and formula ids only mean something within one process. Here the key is
+a digest of the structure instead. Every node of the DAG gets a hash of its class, its atom name or the digests of its
+sub-formulae (each shared node only once, and remembered for as long as the formula lives). The label's key is the
+hash of the sorted digests of its formulae, so it does not depend on their order, or on how often one of them is in it.
+Labels have to be normalized first, otherwise ¬¬p and p are two different keys.
+
+Stored with every answer are the time it took to solve, the engine, and the version of the code that solved it (a
+hash of the source files that decide labels). Lookups take answers of any engine, a correct engine gives the same
+answer as any other, but only those of the current version: one stored by a broken version is not trusted, and it is
+replaced once the label is solved again.
+
+Size: once there are more than max_entries, the least recently used ones go, down to 90% of that so this does not
+happen on every put. With a max_age (seconds), entries not used for that long go as well. Both are checked when the
+store is opened, and then every CHECK_EVERY puts. Counting the entries takes a scan of the table, hence not always.
+
+Several processes can use the same file at once: it is in WAL mode (readers do not block the writer), every write is
+a transaction of its own, and a process that finds the file locked waits for up to TIMEOUT seconds. Two processes
+that solve the same label both put it, the second one overwrites the first (with the same answer).
+"""
+
+# what decides labels. If one of these changes, new answers are stored under another version
+_SOURCES = ("Formula.py", "Reasoner.py", "Closure.py", "Trail.py", "Dpll.py", "Simplify.py", "Heuristics.py",
+            "ModelFinder.py", "Cache.py")
+_version: str | None = None
+
+
+# short hash of the sources above, computed once
+def code_version() -> str:
+    global _version
+    if _version is None:
+        digest = hashlib.blake2b(digest_size=8)
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in _SOURCES:
+            try:
+                with open(os.path.join(here, name), mode="rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(b"missing " + name.encode())
+        _version = digest.hexdigest()
+    return _version
+
+
+class ResultStore:
+    CHECK_EVERY = 1000
+    TIMEOUT = 30.0
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, max_age: float | None = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.connection = sqlite3.connect(path, timeout=ResultStore.TIMEOUT, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, satisfiable INTEGER, "
+                                "seconds REAL, engine TEXT, version TEXT, created REAL, used REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.digests: weakref.WeakKeyDictionary[Formula, bytes] = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.puts = 0
+        self.__shrink()
+
+    # structural digest of the formula, the same in every process
+    def digest(self, formula: Formula) -> bytes:
+        stack = [formula]
+        while stack:  # post-order, every shared sub-formula only once
+            node = stack[-1]
+            if node in self.digests:
+                stack.pop()
+                continue
+            missing = [sub_formula for sub_formula in node.sub_formulae if sub_formula not in self.digests]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            digest = hashlib.blake2b(node.__class__.__name__.encode() + b"\0", digest_size=16)
+            for sub_formula in node.sub_formulae:
+                digest.update(self.digests[sub_formula])
+            if isinstance(node, Atom):
+                digest.update(node.name.encode())
+            self.digests[node] = digest.digest()
+        return self.digests[formula]
+
+    # the key of a normalized label
+    def key(self, label: set[Formula] | frozenset[Formula]) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for formula_digest in sorted({self.digest(formula) for formula in label}):
+            digest.update(formula_digest)
+        return digest.hexdigest()
+
+    # the stored answer, or None if there is none from this version of the code
+    def get(self, key: str) -> bool | None:
+        row = self.connection.execute("SELECT satisfiable FROM results WHERE key = ? AND version = ?",
+                                      (key, code_version())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        return bool(row[0])
+
+    def put(self, key: str, satisfiable: bool, seconds: float, engine: str):
+        now = time.time()
+        self.connection.execute("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?) "
+                                "ON CONFLICT (key) DO UPDATE SET satisfiable = excluded.satisfiable, "
+                                "seconds = excluded.seconds, engine = excluded.engine, version = excluded.version, "
+                                "created = excluded.created, used = excluded.used",
+                                (key, int(satisfiable), seconds, engine, code_version(), now, now))
+        self.puts += 1
+        if self.puts % ResultStore.CHECK_EVERY == 0:
+            self.__shrink()
+
+    # evict by age, then by LRU
+    def __shrink(self):
+        if self.max_age is not None:
+            self.evictions += self.connection.execute("DELETE FROM results WHERE used < ?",
+                                                      (time.time() - self.max_age,)).rowcount
+        count = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self.evictions += self.connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)",
+                (count - self.max_entries * 9 // 10,)).rowcount
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def counters(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "puts": self.puts, "evictions": self.evictions}
+
+    def __str__(self):
+        return ", ".join(f"{name}: {value}" for name, value in self.counters().items())
@@ -1,5 +1,4 @@
 from Formula import *
-from Reasoner import successful
 import Parser
 import time
 
@@ -37,24 +36,31 @@ def __em_formula_str(n: int) -> str:
         return f"{phi_n} ∧ { box_n } ( p{n} → ( ♢ ( p{n + 1} ∧ q{n + 1} ) ∧ ♢ ( p{n + 1} ∧ ¬ q{n + 1} ) {big_and} ) )"
 
 
+# parser throughput in MB/s on about mb MB of generated lines (ϕ_n with spaces, so the two-pass parser can read them)
+# returns the throughput of the single-pass parser and of the old two-pass one
+def parser_throughput(mb: float = 4) -> tuple[float, float]:
+    lines = []
+    size = 0
+    n = 0
+    while size < mb * 2**20:
+        line = __em_formula_str(n % 10)
+        lines.append(line)
+        size += len(line.encode("utf-8"))
+        n += 1
+    throughput = []
+    for parse in (Parser.parse_formula_str, Parser.parse_formula_str_two_pass):
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        throughput.append(size / 2**20 / (time.perf_counter() - start))
+    return throughput[0], throughput[1]
+
+
 if __name__ == '__main__':
+    # ϕ_n and the trivial formulae of size 2^(n+1). The timing lives in Benchmark.py, which has more cases and engines
+    import Benchmark
+    Benchmark.main(["run", "--cases", "phi", "size", "--max-n", "14"])
 
-    measurements = []
-    for n in range(15):
-        label = {exp_model_formula(n).normal_form()}
-        start = time.time()
-        s = successful(label)
-        measurements.append(time.time()-start)
-    with open("./Measurements.txt", encoding="utf-8", mode="w") as f:
-        for n, t in enumerate(measurements):
-            f.write(f"{t * 1000:.3f} ms to satisfy ϕ_{n}\n")
-
-    measurements = []
-    for n in range(15):
-        label = {exp_size_formula(n)}
-        start = time.time()
-        successful(label)
-        measurements.append(time.time()-start)
-    with open("./Measurements.txt", encoding="utf-8", mode="a") as f:
-        for n, t in enumerate(measurements):
-            f.write(f"{t * 1000:.3f} ms to satisfy a (trivial) formula of size 2^{n+1}\n")
+    single_pass, two_pass = parser_throughput()
+    print(f"{single_pass:.3f} MB/s parsing with the single-pass parser")
+    print(f"{two_pass:.3f} MB/s parsing with the two-pass parser")
@@ -0,0 +1,240 @@
+from Formula import *
+from Cache import SatCache
+from Heuristics import Heuristic
+from Budget import Budget
+from Stats import Stats
+
+"""
+A non-recursive version of Reasoner.successful.
+There is exactly one label, which is changed in place. Every change is written to a trail, so going back to an earlier
+state (i.e. backtracking out of a branch) means undoing the trail up to a mark. Instead of recursive calls, the open
+branching points are kept on an explicit stack. Python's recursion limit is therefore never an issue, and no label has
+to be copied for a branch.
+
+Entering a (¬□) successor is just another change of the label: all formulae are removed and the successor's are
+added. Leaving it again undoes that, like any other branch.
+
+Every formula in the label also carries the (¬∧) branching points it depends on, as a bitmask over their positions on
+the stack. A clash then knows which branching points caused it. With backjumping enabled, a (¬∧) branching point that
+did not contribute to the clash of its first branch is not tried a second time: the second branch would run into the
+very same clash. The search jumps straight back to the most recent branching point that did contribute.
+"""
+
+# (¬∧) branching point: the first alternative is being explored. If it clashes, the second one is tried
+class _OrFrame:
+    __slots__ = ("mark", "second", "tried_second", "bit", "deps")
+
+    def __init__(self, mark: int, second: Formula, bit: int, deps: int):
+        self.mark = mark  # trail length right after removing ¬(φ ∧ ψ), but before adding ¬φ
+        self.second = second  # ¬ψ
+        self.tried_second = False
+        self.bit = bit  # this branching point in dependency masks
+        self.deps = deps  # dependencies of ¬(φ ∧ ψ)
+
+
+# (¬□) branching point: the successors are explored one after another, all of them have to be successful
+class _AndFrame:
+    __slots__ = ("mark", "unboxed", "witnesses", "next", "key")
+
+    # unboxed and witnesses come with the dependencies of the □ψ and ¬□φ they stem from
+    def __init__(self, mark: int, unboxed: list[tuple[Formula, int]], witnesses: list[tuple[Formula, int]]):
+        self.mark = mark  # trail length in the world itself, before entering any successor
+        self.unboxed = unboxed
+        self.witnesses = witnesses
+        self.next = 0  # index of the next successor to explore
+        self.key = None  # cache key of the successor being explored, if there is a cache
+
+
+class TrailTableau:
+    def __init__(self, label: set[Formula], cache: SatCache | None = None, backjumping: bool = False,
+                 stats: Stats | None = None, heuristic: Heuristic | None = None, budget: Budget | None = None):
+        self.label: set[Formula] = set()
+        # (formula, whether it was added or removed, its dependencies before it was added)
+        self.trail: list[tuple[Formula, bool, int | None]] = []
+        self.deps: dict[Formula, int] = {}  # the branching points each formula depends on
+        self.conflict = 0  # the branching points the last clash depends on
+        self.pending: list[Formula] = []  # added formulae that still need a (∧) or (¬¬) rule
+        self.cache = cache
+        self.backjumping = backjumping
+        self.stats = stats
+        self.heuristic = heuristic
+        self.budget = budget
+        self.stack: list[_OrFrame | _AndFrame] = []  # the open branching points, innermost last
+        self.initial = label
+
+    # returns False iff the new formula clashes. Then the label is abandoned, so nothing is pending any more
+    def add(self, formula: Formula, deps: int) -> bool:
+        if formula in self.label:
+            return True
+        self.label.add(formula)
+        self.trail.append((formula, True, self.deps.get(formula)))
+        self.deps[formula] = deps
+        if isinstance(formula, Not):
+            opposite = formula.sub_formulae[0]
+            clash = opposite in self.label or isinstance(opposite, Top)
+        else:
+            opposite = Not(formula)
+            clash = opposite in self.label
+        if clash:
+            self.conflict = deps | (self.deps[opposite] if opposite in self.label else 0)
+            self.pending.clear()
+            if self.stats is not None:
+                self.stats.clash(len(self.stack), formula)
+            if self.heuristic is not None:
+                self.heuristic.clash(formula)
+            return False
+        if formula.applicable_tableaux_rule == "NotNot" or formula.applicable_tableaux_rule == "And":
+            self.pending.append(formula)
+        return True
+
+    def remove(self, formula: Formula):  # keeps the dependencies, undo may bring the formula back
+        self.label.remove(formula)
+        self.trail.append((formula, False, None))
+
+    def undo(self, mark: int):
+        while len(self.trail) > mark:
+            formula, added, deps = self.trail.pop()
+            if added:
+                self.label.remove(formula)
+                if deps is None:
+                    del self.deps[formula]
+                else:
+                    self.deps[formula] = deps
+            else:
+                self.label.add(formula)
+
+    # apply all non-branching rules. Returns False on a clash
+    def saturate(self) -> bool:
+        while self.pending:
+            formula = self.pending.pop()
+            if formula not in self.label:  # was taken care of already
+                continue
+            self.remove(formula)
+            if self.stats is not None:
+                self.stats.rule(formula.applicable_tableaux_rule, len(self.stack), formula)
+            deps = self.deps[formula]
+            if formula.applicable_tableaux_rule == "NotNot":
+                consistent = self.add(formula.sub_formulae[0].sub_formulae[0], deps)
+            else:  # And
+                consistent = self.add(formula.sub_formulae[0], deps) and self.add(formula.sub_formulae[1], deps)
+            if not consistent:
+                return False
+        return True
+
+    # replace the label by the given formulae (with their dependencies), then saturate. Returns False on a clash
+    def enter(self, formulae) -> bool:
+        for formula in list(self.label):
+            self.remove(formula)
+        for formula, deps in formulae:
+            if not self.add(formula, deps):
+                return False
+        return self.saturate()
+
+    def run(self) -> bool:
+        stack = self.stack
+        # result of the label we are currently looking at. None means it is clash-free, but not decided yet
+        result = None if self.enter((formula, 0) for formula in self.initial) else False
+        while True:
+            if result is None:
+                result = self.expand(stack)
+                continue
+
+            # we know the result of the current label, hand it to the innermost open branching point
+            if not stack:
+                return result
+            frame = stack[-1]
+            if isinstance(frame, _OrFrame):
+                if result or frame.tried_second:
+                    stack.pop()  # decided, hand the result further up
+                    continue
+                if self.backjumping and not self.conflict & frame.bit:
+                    # the clash did not depend on this branch, the second one clashes too
+                    if self.stats is not None:
+                        self.stats.pruned += 1
+                    stack.pop()
+                    continue
+                self.undo(frame.mark)
+                frame.tried_second = True
+                # ¬ψ is only there, because ¬φ clashed. So it depends on whatever that clash depended on
+                deps = frame.deps | (self.conflict & ~frame.bit)
+                result = None if self.add(frame.second, deps) and self.saturate() else False
+            else:
+                if self.cache is not None:
+                    self.cache.put(frame.key, result)
+                if self.heuristic is not None:  # the ¬□φ of the successor with ¬φ
+                    self.heuristic.successor(Not(Box(frame.witnesses[frame.next - 1][0].sub_formulae[0])), result)
+                if not result:  # the successor only exists because of its ¬□φ, so the clash depends on that too
+                    self.conflict |= frame.witnesses[frame.next - 1][1]
+                if not result or frame.next == len(frame.witnesses):
+                    self.undo(frame.mark)
+                    stack.pop()
+                    continue
+                self.undo(frame.mark)
+                result = self.next_successor(frame)
+
+    # the label is saturated and clash-free. Apply a branching rule, or decide it if there is none
+    def expand(self, stack: list[_OrFrame | _AndFrame]) -> bool | None:
+        if self.stats is not None:
+            self.stats.node(len(stack), len(self.label))
+        if self.budget is not None:
+            self.budget.spend()
+        # (¬∧) first. As a crude heuristic we branch on the smallest formula first, see Reasoner.successful
+        or_branches = [formula for formula in self.label if formula.applicable_tableaux_rule == "NotAnd"]
+        if or_branches:
+            if self.heuristic is None:
+                branch_formula = min(or_branches, key=lambda f: f.size)
+            else:
+                branch_formula = self.heuristic.or_branch(or_branches)
+            self.remove(branch_formula)
+            if self.stats is not None:
+                self.stats.rule("NotAnd", len(stack), branch_formula)
+            conjuncts = branch_formula.sub_formulae[0].sub_formulae
+            frame = _OrFrame(len(self.trail), Not(conjuncts[1]), 1 << len(stack), self.deps[branch_formula])
+            stack.append(frame)
+            return None if self.add(Not(conjuncts[0]), frame.deps | frame.bit) and self.saturate() else False
+
+        and_branches = [formula for formula in self.label if formula.applicable_tableaux_rule == "NotBox"]
+        if not and_branches:
+            if self.stats is not None:
+                self.stats.open(len(stack))
+            return True  # saturated
+        if self.heuristic is None:
+            and_branches.sort(key=lambda f: f.size)
+        else:
+            and_branches = self.heuristic.and_order(and_branches)
+        frame = _AndFrame(len(self.trail),
+                          [(formula.sub_formulae[0], self.deps[formula]) for formula in self.label
+                           if isinstance(formula, Box)],
+                          [(Not(formula.sub_formulae[0].sub_formulae[0]), self.deps[formula])
+                           for formula in and_branches])
+        stack.append(frame)
+        return self.next_successor(frame)
+
+    # enter the next (¬□) successor of the frame. It may already be decided by the cache, or by a clash
+    def next_successor(self, frame: _AndFrame) -> bool | None:
+        witness = frame.witnesses[frame.next]
+        frame.next += 1
+        if self.stats is not None:  # the ¬□φ of the successor with ¬φ
+            self.stats.rule("NotBox", len(self.stack) - 1, Not(Box(witness[0].sub_formulae[0])))
+        if self.cache is not None:
+            frame.key = frozenset(formula for formula, _ in frame.unboxed).union((witness[0],))
+            known = self.cache.get(frame.key)
+            if known is False:  # we do not know which formulae clashed, so blame all of them
+                self.conflict = 0
+                for _, deps in frame.unboxed:
+                    self.conflict |= deps
+            if known is not None:
+                return known
+        return None if self.enter(frame.unboxed + [witness]) else False
+
+
+# same answers as Reasoner.successful, but with constant stack depth. Call it with normalized labels
+def successful_trail(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                     heuristic: Heuristic | None = None, budget: Budget | None = None) -> bool:
+    return TrailTableau(label, cache, stats=stats, heuristic=heuristic, budget=budget).run()
+
+
+# the trail engine with dependency directed backjumping over (¬∧) branching points
+def successful_backjumping(label: set[Formula], cache: SatCache | None = None, stats: Stats | None = None,
+                           heuristic: Heuristic | None = None, budget: Budget | None = None) -> bool:
+    return TrailTableau(label, cache, backjumping=True, stats=stats, heuristic=heuristic, budget=budget).run()
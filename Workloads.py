@@ -0,0 +1,269 @@
+import argparse
+import math
+import os
+import random
+from Formula import *
+
+"""
+Scalable workloads, written as files in the Input.txt format (one label per line, the formulae separated by commas).
+
+The lwb command writes families in the style of the Logics Workbench benchmark for K (Balsiger, Heuerding,
+Schwendimann 2000): k_branch, k_d4, k_dum, k_grz, k_lin, k_path, k_ph, k_poly and k_t4p, with one line per size
+n = 1, 2, ... Every family comes in two variants. The lines of k_..._p are unsatisfiable, i.e. their negation is
+provable, and the lines of k_..._n are satisfiable. So the expected answers are known for every n, and are written
+next to each file, one per line, to <name>.expected. Benchmark.py checks them.
+The original LWB files are not around here, so the families are rebuilt from their ideas (the axiom or combinatorial
+problem they are named after). The comment at each generator says why its answer is what it is.
+
+The random command writes random modal k-CNF (the 3CNF_□ generator of Giunchiglia, Sebastiani et al.), seeded, for
+phase-transition studies: L = ratio * N clauses of k distinct literals. A literal is negated with probability 1/2,
+and below the maximal modal depth it is an atom with probability prop, and □ of a random clause one level deeper
+otherwise. Their answers are not known in advance, so no .expected file is written.
+"""
+
+
+def boxes(formula: Formula, n: int) -> Formula:
+    for _ in range(n):
+        formula = Box(formula)
+    return formula
+
+
+def diamonds(formula: Formula, n: int) -> Formula:
+    for _ in range(n):
+        formula = Diamond(formula)
+    return formula
+
+
+def conjunction(formulae: list[Formula]) -> Formula:
+    if not formulae:
+        return Top()
+    result = formulae[0]
+    for formula in formulae[1:]:
+        result = And(result, formula)
+    return result
+
+
+def disjunction(formulae: list[Formula]) -> Formula:
+    if not formulae:
+        return Bot()
+    result = formulae[0]
+    for formula in formulae[1:]:
+        result = Or(result, formula)
+    return result
+
+
+# the formula at every world up to depth n: one formula of the label per depth
+def up_to(formula: Formula, n: int) -> list[Formula]:
+    return [boxes(formula, i) for i in range(n + 1)]
+
+
+# Halpern and Moses' branching formulae: q_i marks depth i (q_0 ... q_i hold there), and every world of depth i < n has
+# two successors, one with p_{i+1} and one with ¬p_{i+1}, which are passed on to all descendants. So every model
+# contains a full binary tree of depth n, and the tableau has to build all of it.
+# _p: every leaf (depth n) has to make p_k true, with k = ⌈n/3⌉. The subtree below ¬p_k cannot
+def k_branch(n: int, provable: bool) -> list[Formula]:
+    q = [Atom(f"q{i}") for i in range(n + 2)]
+    p = [Atom(f"p{i}") for i in range(n + 1)]  # p[0] is not used
+
+    def at(i: int) -> Formula:
+        return And(q[i], Not(q[i + 1]))
+
+    rules = [Implication(q[i], q[i - 1]) for i in range(1, n + 2)]
+    for i in range(n):
+        rules.append(Implication(at(i), And(Diamond(And(at(i + 1), p[i + 1])),
+                                            Diamond(And(at(i + 1), Not(p[i + 1]))))))
+        if i > 0:
+            rules.append(Implication(at(i), conjunction([And(Implication(p[j], Box(p[j])),
+                                                             Implication(Not(p[j]), Box(Not(p[j]))))
+                                                         for j in range(1, i + 1)])))
+    if provable:
+        rules.append(Implication(at(n), p[math.ceil(n / 3)]))
+    return [at(0)] + up_to(conjunction(rules), n)
+
+
+# D (◇⊤) and 4 (□p → □□p) as premises up to depth n-1. Starting from □p, the 4 instances pass □p down to depth n,
+# so p holds down to depth n+1.
+# _p: ¬p at depth n+1. _n: ¬p at depth n+2, one further than the instances reach
+def k_d4(n: int, provable: bool) -> list[Formula]:
+    p = Atom("p")
+    premise = And(Diamond(Top()), Implication(Box(p), Box(Box(p))))
+    return [Box(p)] + up_to(premise, n - 1) + [diamonds(Not(p), n + 1 if provable else n + 2)]
+
+
+# k_d4 with dummies: at every depth a disjunction over fresh atoms, which has nothing to do with the answer. It holds
+# as soon as all d_i are false, but a prover that branches on it blindly explores lots of useless alternatives
+def k_dum(n: int, provable: bool) -> list[Formula]:
+    d = [Atom(f"d{i}") for i in range(n + 2)]
+    dummies = [boxes(Or(Box(Implication(d[i], d[i + 1])), Diamond(And(Not(d[i]), Diamond(d[i + 1])))), i)
+               for i in range(n + 1)]
+    return k_d4(n, provable) + dummies
+
+
+# Grzegorczyk's axiom G = □(□(p → □p) → p) → p, without the outer box, and p → □p as premises up to depth n.
+# A world of depth < n has all successors satisfying p → □p, so G makes p true there. p → □p passes it on, so p holds
+# at every world of depth at most n+1, but each of them has to refute the ¬□(p → □p) alternative of G first.
+# _p: ¬p at depth n+1. _n: ¬p at depth n+2
+def k_grz(n: int, provable: bool) -> list[Formula]:
+    p = Atom("p")
+    grz = Implication(Box(Implication(p, Box(p))), p)
+    return up_to(And(grz, Implication(p, Box(p))), n) + [diamonds(Not(p), n + 1 if provable else n + 2)]
+
+
+# a chain of implications p_1 → p_2 → ... → p_{n+1} in the successors, mixed with instances of the linearity axiom
+# □(□p_i → q_i) ∨ □(□q_i → p_i), which holds in no particular way, but doubles the search space with each i.
+# _p: □p_1 and a successor with ¬p_{n+1}. _n: the same, but the chain is broken in the middle
+def k_lin(n: int, provable: bool) -> list[Formula]:
+    p = [Atom(f"p{i}") for i in range(n + 2)]
+    q = [Atom(f"q{i}") for i in range(n + 2)]
+    broken = (n + 1) // 2
+    label = [Box(p[1]), Diamond(Not(p[n + 1]))]
+    for i in range(1, n + 1):
+        if not provable and i == broken:
+            label.append(Box(Implication(p[i + 1], p[i])))
+        else:
+            label.append(Box(Implication(p[i], p[i + 1])))
+        label.append(Or(Box(Implication(Box(p[i]), q[i])), Box(Implication(Box(q[i]), p[i]))))
+    return label
+
+
+# a path of length n, on which every world satisfies a_i or b_i: a_i allows both for the next world, b_i only a_{i+1}.
+# The tableau has to decide between a and b at every depth, and all these choices fail only at the very end.
+# _p: a world at depth n with neither a_n nor b_n. _n: only without a_n, which b_n allows
+def k_path(n: int, provable: bool) -> list[Formula]:
+    a = [Atom(f"a{i}") for i in range(n + 1)]
+    b = [Atom(f"b{i}") for i in range(n + 1)]
+    rules = [And(Implication(a[i], Box(Or(a[i + 1], b[i + 1]))), Implication(b[i], Box(a[i + 1])))
+             for i in range(n)]
+    goal = And(Not(a[n]), Not(b[n])) if provable else Not(a[n])
+    return [a[0]] + [boxes(rule, i) for i, rule in enumerate(rules)] + [diamonds(goal, n)]
+
+
+# the pigeonhole principle, with ◇p_{i,j} (pigeon i sits in hole j) as its atoms. The ◇-atoms can be true and false
+# independent of each other, so this is satisfiable iff the propositional version is.
+# _p: n+1 pigeons in n holes. _n: n+1 pigeons in n+1 holes
+def k_ph(n: int, provable: bool) -> list[Formula]:
+    holes = n if provable else n + 1
+    sits = [[Diamond(Atom(f"p{i}_{j}")) for j in range(holes)] for i in range(n + 1)]
+    label = [disjunction(sits[i]) for i in range(n + 1)]  # every pigeon sits somewhere
+    for j in range(holes):  # no two in the same hole
+        for i in range(n + 1):
+            for k in range(i + 1, n + 1):
+                label.append(Not(And(sits[i][j], sits[k][j])))
+    return label
+
+
+# paths of all lengths 1 ... n, the i-th ending in p_i, and every world up to depth n has a successor. The models
+# have polynomial size, but the tableau has to go through all of the paths.
+# _p: no p_n at depth n, where the longest path ends. _n: no p_{n-1} at depth n, one further than its path goes
+def k_poly(n: int, provable: bool) -> list[Formula]:
+    p = [Atom(f"p{i}") for i in range(n + 1)]
+    label = [diamonds(p[i], i) for i in range(1, n + 1)] + up_to(Diamond(Top()), n)
+    return label + [boxes(Not(p[n] if provable else p[n - 1]), n)]
+
+
+# T (□p → p) and 4 (□p → □□p) as premises up to depth n-1. Like k_d4, the 4 instances pass □p down to depth n,
+# and each T instance is another disjunction for the tableau.
+# _p: ¬p at depth n+1. _n: ¬p at depth n+2
+def k_t4p(n: int, provable: bool) -> list[Formula]:
+    p = Atom("p")
+    premise = And(Implication(Box(p), p), Implication(Box(p), Box(Box(p))))
+    return [Box(p)] + up_to(premise, n - 1) + [diamonds(Not(p), n + 1 if provable else n + 2)]
+
+
+LWB = {
+    "k_branch": k_branch,
+    "k_d4": k_d4,
+    "k_dum": k_dum,
+    "k_grz": k_grz,
+    "k_lin": k_lin,
+    "k_path": k_path,
+    "k_ph": k_ph,
+    "k_poly": k_poly,
+    "k_t4p": k_t4p,
+}
+
+
+def random_clause(rng: random.Random, depth: int, atoms: int, k: int = 3, prop: float = 0.5) -> Formula:
+    literals: list[Formula] = []
+    for _ in range(100 * k):  # with very few atoms there may not be k distinct literals, give up eventually
+        if len(literals) == k:
+            break
+        if depth == 0 or rng.random() < prop:
+            literal = Atom(f"p{rng.randrange(atoms)}")
+        else:
+            literal = Box(random_clause(rng, depth - 1, atoms, k, prop))
+        if literal not in literals and Not(literal) not in literals:  # every atom at most once per clause
+            literals.append(literal)
+    return disjunction([Not(literal) if rng.random() < 0.5 else literal for literal in literals])
+
+
+# one random modal k-CNF formula of the given modal depth, as a label of its clauses
+def random_cnf(rng: random.Random, depth: int, atoms: int, ratio: float, k: int = 3,
+               prop: float = 0.5) -> list[Formula]:
+    return [random_clause(rng, depth, atoms, k, prop) for _ in range(max(1, round(ratio * atoms)))]
+
+
+def label_line(label: list[Formula]) -> str:
+    return ", ".join(str(formula) for formula in label)
+
+
+# the expected answers of an input file, "sat" or "unsat" for each of its labels. None if they are not known
+def expected(path: str) -> list[str] | None:
+    answers = os.path.splitext(path)[0] + ".expected"
+    if not os.path.exists(answers):
+        return None
+    with open(answers, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_lwb(directory: str, families: list[str], sizes: range) -> list[str]:
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for family in families:
+        for provable in (True, False):
+            name = os.path.join(directory, f"{family}_{'p' if provable else 'n'}")
+            with open(name + ".txt", encoding="utf-8", mode="w") as labels, \
+                    open(name + ".expected", encoding="utf-8", mode="w") as answers:
+                for n in sizes:
+                    labels.write(label_line(LWB[family](n, provable)) + "\n")
+                    answers.write(("unsat" if provable else "sat") + "\n")
+            written.append(name + ".txt")
+    return written
+
+
+def write_random(path: str, count: int, depth: int, atoms: int, ratio: float, k: int = 3, prop: float = 0.5,
+                 seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, encoding="utf-8", mode="w") as f:
+        for _ in range(count):
+            f.write(label_line(random_cnf(rng, depth, atoms, ratio, k, prop)) + "\n")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Writes benchmark inputs in the Input.txt format")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    lwb_parser = commands.add_parser("lwb", help="LWB style K families, a _p (unsatisfiable) and a _n file each")
+    lwb_parser.add_argument("--family", nargs="+", choices=LWB, default=list(LWB))
+    lwb_parser.add_argument("--max-n", type=int, default=10, help="one label per n = 1 ... max-n")
+    lwb_parser.add_argument("--out", default="workloads", help="directory for the files")
+
+    random_parser = commands.add_parser("random", help="seeded random modal k-CNF")
+    random_parser.add_argument("--count", type=int, default=100, help="number of labels")
+    random_parser.add_argument("--depth", type=int, default=1, help="modal depth")
+    random_parser.add_argument("--atoms", type=int, default=4, help="number of propositional atoms N")
+    random_parser.add_argument("--ratio", type=float, default=10, help="clauses per atom, L/N")
+    random_parser.add_argument("--k", type=int, default=3, help="literals per clause")
+    random_parser.add_argument("--prop", type=float, default=0.5,
+                               help="probability that a literal above the maximal depth is an atom, not a □")
+    random_parser.add_argument("--seed", type=int, default=0)
+    random_parser.add_argument("--out", help="file to write. Default: random_d<depth>_n<atoms>_r<ratio>_s<seed>.txt")
+
+    args = arg_parser.parse_args()
+    if args.command == "lwb":
+        for path in write_lwb(args.out, args.family, range(1, args.max_n + 1)):
+            print(path)
+    else:
+        out = args.out or f"random_d{args.depth}_n{args.atoms}_r{args.ratio:g}_s{args.seed}.txt"
+        write_random(out, args.count, args.depth, args.atoms, args.ratio, args.k, args.prop, args.seed)
+        print(out)
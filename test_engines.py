@@ -0,0 +1,110 @@
+import random
+import pytest
+from Formula import *
+import Parser
+import Reasoner
+import Parallel
+import Workloads
+from Cache import SatCache
+from Heuristics import HEURISTICS
+from ModelFinder import ModelFinder
+from Session import ReasonerSession
+
+"""
+Differential tests: every way of deciding a label has to give the same answer as Reasoner.successful, the plain
+recursive tableau without cache or heuristic. That is every engine with every heuristic, with and without the cache,
+Simplify and the model search, as well as incrementally in a ReasonerSession and split up by Parallel.decide_all.
+
+Labels are the examples of Input.txt, the LWB families for small n (both the provable and the unprovable variant), and
+seeded random modal CNF. Sizes are kept small enough for the reference to answer within milliseconds: k_branch and
+k_ph take seconds to minutes from n = 3 on.
+"""
+
+SLOW = {"k_branch", "k_ph"}
+
+
+# (index, label) pairs, with the reference answer of each
+def __labels(count: int = 20, seed: int = 0) -> list[tuple[int, set[Formula], bool]]:
+    labels = [label for _, label in Parser.iter_file("Input.txt")]
+    for family, generate in Workloads.LWB.items():
+        for n in (1, 2) if family in SLOW else (1, 2, 3):
+            labels.extend(set(generate(n, provable)) for provable in (True, False))
+    rng = random.Random(seed)
+    for _ in range(count):
+        labels.append(set(Workloads.random_cnf(rng, 2, 3, rng.choice([1, 2, 3]), prop=0.7)))
+    return [(i, label, Reasoner.successful(Reasoner.normalized(label))) for i, label in enumerate(labels)]
+
+
+LABELS = __labels()
+
+
+def test_labels_are_mixed():
+    answers = [expected for _, _, expected in LABELS]
+    assert any(answers) and not all(answers)
+
+
+@pytest.mark.parametrize("model_search", [False, True])
+@pytest.mark.parametrize("simplify", [False, True])
+@pytest.mark.parametrize("heuristic", HEURISTICS)
+@pytest.mark.parametrize("engine", Reasoner.ENGINES)
+def test_decide(engine: str, heuristic: str, simplify: bool, model_search: bool):
+    cache = SatCache(1000)  # shared by all labels, like in a batch
+    # a small search, it has to give up on every unsatisfiable label in every combination
+    finder = ModelFinder(2, tries=1, seed=0) if model_search else None
+    for i, label, expected in LABELS:
+        assert Reasoner.decide(label, engine, None, None, simplify, heuristic, finder=finder) == expected, i
+        assert Reasoner.decide(label, engine, cache, None, simplify, heuristic, finder=finder) == expected, i
+
+
+def test_models():
+    finder = ModelFinder(seed=0)
+    for i, label, expected in LABELS:
+        model = finder.find(Reasoner.normalized(label))
+        if model is not None:  # only ever for satisfiable labels, and then it is a model of the label
+            assert expected, i
+            assert all(model.satisfies(formula) for formula in Reasoner.normalized(label)), i
+    assert finder.hits > 0
+
+
+def test_session():
+    session = ReasonerSession()
+    for i, label, expected in LABELS:
+        session.push(*label)
+        assert session.check() == expected, i
+        session.pop()
+    assert session.check_many(label for _, label, _ in LABELS) == [expected for _, _, expected in LABELS]
+
+
+def test_session_background():
+    for i, label, expected in LABELS:
+        formulae = list(label)
+        session = ReasonerSession(formulae[:1])
+        session.push(*formulae[1:2])
+        assert session.check(formulae[2:]) == expected, i
+        assert session.pop() == [formula.normal_form() for formula in formulae[1:2]]
+        assert session.check() == Reasoner.successful(Reasoner.normalized(set(formulae[:1]))), i
+
+
+@pytest.mark.parametrize("engine", Reasoner.ENGINES)
+def test_split_labels(engine: str):
+    # threshold 1 splits every label into sub-problems, which have to be normal forms for every engine
+    labels = [(i, label) for i, label, _ in LABELS]
+    labels.append((len(labels), Parser.parse_label_str("◇ ( p ∧ ¬ p ), ◇ q, ◇ r, ◇ s, ◇ t")))
+    expected = {i: expected for i, _, expected in LABELS}
+    expected[len(labels) - 1] = False
+    for i, _, satisfiable, _ in Parallel.decide_all(labels, engine, jobs=2, threshold=1):
+        assert satisfiable == expected[i], i
+
+
+@pytest.mark.parametrize("engine", Reasoner.ENGINES)
+def test_forget_between_labels(engine: str, monkeypatch):
+    # forget all formulae before every label. Labels are parsed again, as from a file, and made of new nodes then.
+    # The intern table of before is put back afterwards, other tests still use its nodes
+    monkeypatch.setattr(Reasoner, "FORGET_AFTER", 0)
+    monkeypatch.setattr(Formula, "_Formula__interned", Formula._Formula__interned)
+    texts = [(i, ", ".join(str(formula) for formula in label)) for i, label, _ in LABELS]
+    labels = ((i, Parser.parse_label_str(text)) for i, text in texts)
+    expected = {i: expected for i, _, expected in LABELS}
+    for i, _, satisfiable, _ in Reasoner.decide_stream(labels, engine, SatCache(1000)):
+        assert satisfiable == expected[i], i
+    assert Top() is TOP and Bot().normal_form() is BOT
@@ -0,0 +1,70 @@
+import pytest
+from Formula import *
+import Parser
+
+"""
+Tests of the single-pass parser: precedence and associativity, the ASCII spellings, errors, and formulae far deeper
+than Python's recursion limit.
+"""
+
+p, q, r = Atom("p"), Atom("q"), Atom("r")
+
+
+@pytest.mark.parametrize("text, formula", [
+    ("p ∧ q ∨ r", Or(And(p, q), r)),
+    ("p ∨ q ∧ r", Or(p, And(q, r))),
+    ("p ∨ q → r", Implication(Or(p, q), r)),
+    ("p → q ⇔ r", BiImplication(Implication(p, q), r)),
+    ("p → q → r", Implication(p, Implication(q, r))),  # right-associative
+    ("p ∧ q ∧ r", And(And(p, q), r)),  # left-associative
+    ("¬ p ∧ q", And(Not(p), q)),
+    ("□ p → ◇ q", Implication(Box(p), Diamond(q))),
+    ("¬ □ ¬ p", Not(Box(Not(p)))),
+    ("¬ ( p ∧ q )", Not(And(p, q))),
+    ("◇ ( p ∨ ⊥ ) ∧ ⊤", And(Diamond(Or(p, Bot())), Top())),
+])
+def test_precedence(text: str, formula: Formula):
+    assert Parser.parse_formula_str(text) is formula
+
+
+@pytest.mark.parametrize("text, unicode", [
+    ("~p /\\ q", "¬ p ∧ q"),
+    ("p\\/q -> r <-> []p", "p ∨ q → r ⇔ □ p"),
+    ("<>(p n q) v r", "◇ ( p ∧ q ) ∨ r"),
+    ("♢p ↔ □q", "◇ p ⇔ □ q"),
+])
+def test_spellings(text: str, unicode: str):
+    assert Parser.parse_formula_str(text) is Parser.parse_formula_str(unicode)
+
+
+@pytest.mark.parametrize("text", ["p ∧ ∧", "∧ p", "¬", "p →", "", "( )"])
+def test_errors(text: str):
+    with pytest.raises(ValueError):
+        Parser.parse_formula_str(text)
+
+
+def test_label_errors():
+    with pytest.raises(ValueError):
+        Parser.parse_label_str("p, , q")
+
+
+def test_iter_lines_reports_errors():
+    errors = []
+    lines = ["p ∧ q", "p ∧ ∧", "", "◇ p, □ ¬ p", "p, , q", "r"]
+    labels = list(Parser.iter_lines(lines, lambda n, message: errors.append((n, message))))
+    assert [n for n, _ in labels] == [0, 3, 5]
+    assert labels[1][1] == {Diamond(p), Box(Not(p))}
+    assert [n for n, _ in errors] == [1, 4]
+    with pytest.raises(ValueError):
+        list(Parser.iter_lines(lines))
+
+
+def test_deep_nesting():
+    depth = 100_000
+    assert Parser.parse_formula_str("¬ " * depth + "p").modal_depth == 0
+    boxed = Parser.parse_formula_str("□ ( " * depth + "p" + " )" * depth)
+    assert boxed.modal_depth == depth
+    assert str(boxed).count("◻") == depth
+    chain = Parser.parse_formula_str(" ∧ ".join(f"p{i}" for i in range(depth)))
+    assert chain.size == depth - 1
+    assert chain.normal_form() is chain
@@ -0,0 +1,30 @@
+import Parser
+import Reasoner
+import Store
+from Store import ResultStore
+
+"""
+Tests of the ResultStore: keys that do not depend on the order of a label, and answers that are only trusted from the
+current version of the code.
+"""
+
+
+def test_key_ignores_order(tmp_path):
+    with ResultStore(str(tmp_path / "answers.db")) as store:
+        first = Reasoner.normalized(Parser.parse_label_str("◇ p, □ ¬ p, q"))
+        second = Reasoner.normalized(Parser.parse_label_str("q, □ ¬ p, ◇ p, q"))
+        assert store.key(first) == store.key(second)
+        assert store.key(first) != store.key(Reasoner.normalized(Parser.parse_label_str("◇ p, □ p")))
+
+
+def test_answers_of_other_versions(tmp_path):
+    label = Parser.parse_label_str("◇ p, □ ¬ p")
+    with ResultStore(str(tmp_path / "answers.db")) as store:
+        key = store.key(Reasoner.normalized(label))
+        store.put(key, True, 0.0, "recursive")  # wrong, as if from a broken version
+        store.connection.execute("UPDATE results SET version = 'broken'")
+        assert store.get(key) is None
+        assert Reasoner.decide(label, store=store) is False
+        assert store.get(key) is False
+        assert len(store) == 1
+        assert store.connection.execute("SELECT version FROM results").fetchone()[0] == Store.code_version()